@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the cold import time of simcityexplore modules.
+
+Each module is imported in a fresh interpreter, a number of times, and the
+median import time is reported with the heavy dependencies that the import
+loaded. Exits with an error if a module that should be light loads a heavy
+dependency.
+"""
+
+from __future__ import print_function
+import argparse
+import subprocess
+import json
+import sys
+import os
+
+MODULES = ['simcityexplore', 'simcityexplore.parameter',
+           'simcityexplore.ensemble', 'simcityexplore.simulator',
+           'simcityexplore.orthogonal', 'simcityexplore.simemcee',
+           'simcityexplore.optimize', 'simcityexplore.runner']
+# modules that must not load any heavy dependency
+LIGHT = ['simcityexplore', 'simcityexplore.parameter',
+         'simcityexplore.ensemble', 'simcityexplore.simulator',
+         'simcityexplore.orthogonal', 'simcityexplore.simemcee',
+         'simcityexplore.runner']
+HEAVY = ['picas', 'simcity', 'couchdb', 'numpy', 'scipy', 'matplotlib',
+         'pyDOE']
+
+PROGRAM = '''
+import json, sys, time
+start = time.time()
+import {module}
+end = time.time()
+print(json.dumps({{'seconds': end - start,
+                   'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def import_time(module, python=sys.executable):
+    '''
+    Import a module in a new interpreter.
+
+    Returns:
+        the import time in seconds and the heavy modules it loaded
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output(
+        [python, '-c', PROGRAM.format(module=module, heavy=HEAVY)], cwd=root)
+    result = json.loads(output.decode('utf-8').strip().split('\n')[-1])
+    return result['seconds'], result['loaded']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the cold import '
+                                     'time of simcityexplore modules.')
+    parser.add_argument('-n', '--repeat', type=int, default=5,
+                        help='number of imports of each module')
+    parser.add_argument('modules', nargs='*', default=MODULES,
+                        help='modules to import')
+    args = parser.parse_args()
+
+    failed = []
+    for module in args.modules:
+        times = []
+        for _ in range(args.repeat):
+            seconds, loaded = import_time(module)
+            times.append(seconds)
+        times.sort()
+        print('{0:28s} {1:8.1f} ms  loads: {2}'.format(
+            module, 1000 * times[len(times) // 2],
+            ', '.join(loaded) or '-'))
+        if module in LIGHT and loaded:
+            failed.append(module)
+
+    if failed:
+        print('heavy dependencies loaded by {0}'.format(', '.join(failed)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the overhead of the Simulator with a fake task backend.
+
+For each number of concurrent points, that many points are started at once
+on a FakeBackend with the given latency and failure rate, and all of them
+are joined. Reported are the rate at which points were started, the
+overall throughput, the CPU time of the driver and of its simulator
+processes, the peak memory of the driver, and percentiles of the time
+from starting to joining a point.
+"""
+
+from __future__ import print_function, division
+import argparse
+import resource
+import json
+import time
+import sys
+import os
+
+# run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from simcityexplore.simulator import Simulator  # noqa: E402
+from simcityexplore.backend import FakeBackend  # noqa: E402
+import numpy as np  # noqa: E402
+
+
+def scoring(task):
+    return json.loads(task.get_attachment('input.json')['data']
+                      .decode('utf-8'))['x']
+
+
+def cpu_time(who):
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def benchmark(points, backend, polling_time, scoring_processes=None):
+    '''
+    Start and join `points` points on a simulator.
+
+    Returns:
+        a dict with the measurements
+    '''
+    simulator = Simulator('bench', '0.1', 'fake', scoring, None,
+                          max_jobs=points, polling_time=polling_time,
+                          argnames=['x'], backend=backend,
+                          scoring_processes=scoring_processes)
+    cpu = cpu_time(resource.RUSAGE_SELF)
+    children = cpu_time(resource.RUSAGE_CHILDREN)
+    start = time.time()
+    for i in range(points):
+        simulator.start([i])
+    submitted = time.time()
+    failed = 0
+    for _ in range(points):
+        _, value = simulator.join()
+        failed += isinstance(value, Exception)
+    end = time.time()
+    simulator.close()
+
+    latencies = [timeline['phases']['joined'] - timeline['phases']['started']
+                 for timeline in simulator.metrics.timelines]
+    return {
+        'points': points,
+        'failed': failed,
+        'submissions': points / (submitted - start),
+        'throughput': points / (end - start),
+        'driver_cpu': cpu_time(resource.RUSAGE_SELF) - cpu,
+        'process_cpu': cpu_time(resource.RUSAGE_CHILDREN) - children,
+        # kilobytes on Linux
+        'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'latency': np.percentile(latencies, [50, 95, 99]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the overhead of '
+                                     'the Simulator with a fake backend.')
+    parser.add_argument('--points', type=int, nargs='+',
+                        default=[10, 100, 1000],
+                        help='numbers of concurrent points to measure, for '
+                        'example 10 100 1000 10000')
+    parser.add_argument('--latency', type=float, default=0.1,
+                        help='mean runtime of a task in seconds')
+    parser.add_argument('--distribution', default='fixed',
+                        choices=['fixed', 'exponential'],
+                        help='distribution of the task runtime')
+    parser.add_argument('--failure-rate', type=float, default=0,
+                        help='probability that a task fails')
+    parser.add_argument('--init-time', type=float, default=0,
+                        help='seconds to initialize a simulator process')
+    parser.add_argument('--polling-time', type=float, default=0.01,
+                        help='polling time of the simulator in seconds')
+    parser.add_argument('--scoring-processes', type=int,
+                        help='score in a pool of this many processes')
+    parser.add_argument('--seed', type=int, help='random seed')
+    parser.add_argument('--show-errors', action='store_true',
+                        help='show the tracebacks of failed tasks')
+    args = parser.parse_args()
+
+    backend = FakeBackend(args.latency, args.distribution, args.failure_rate,
+                          args.init_time, args.seed)
+    print('{0:>7s} {1:>7s} {2:>10s} {3:>10s} {4:>9s} {5:>9s} {6:>8s} '
+          '{7:>8s} {8:>8s} {9:>8s}'.format(
+              'points', 'failed', 'submit/s', 'joined/s', 'cpu (s)',
+              'procs (s)', 'rss (MB)', 'p50 (s)', 'p95 (s)', 'p99 (s)'))
+    for points in args.points:
+        if not args.show_errors:
+            # simulator processes print the traceback of failed tasks
+            stderr = os.dup(2)
+            with open(os.devnull, 'w') as devnull:
+                os.dup2(devnull.fileno(), 2)
+        try:
+            result = benchmark(points, backend, args.polling_time,
+                               args.scoring_processes)
+        finally:
+            if not args.show_errors:
+                os.dup2(stderr, 2)
+                os.close(stderr)
+        print('{points:7d} {failed:7d} {submissions:10.1f} '
+              '{throughput:10.1f} {driver_cpu:9.2f} {process_cpu:9.2f} '
+              '{max_rss:8.1f} {0:8.3f} {1:8.3f} {2:8.3f}'.format(
+                  *result['latency'], **result))
+
+
+if __name__ == '__main__':
+    main()
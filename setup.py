@@ -27,6 +27,14 @@ setup(name='simcityexplore',
       author_email='j.borgdorff@esciencecenter.nl',
       url='https://esciencecenter.nl/projects/sim-city/',
       packages=['simcityexplore'],
+      entry_points={
+          'console_scripts': [
+              'simcityexplore-orthogonal = simcityexplore.orthogonal:main',
+              'simcityexplore-simemcee = simcityexplore.simemcee:main',
+              'simcityexplore-optimize = simcityexplore.optimize:main',
+              'simcityexplore-run = simcityexplore.runner:main',
+          ],
+      },
       classifiers=[
           'License :: OSI Approved :: Apache Software License',
           'Intended Audience :: Developers',
@@ -41,6 +49,6 @@ setup(name='simcityexplore',
           'Programming Language :: Python :: 2 :: Only',
           'Topic :: System :: Distributed Computing'
       ],
-      install_requires=['numpy', 'matplotlib', 'emcee', 'simcity'],
+      install_requires=['numpy', 'matplotlib', 'simcity'],
       tests_require=['nose', 'pyflakes', 'pep8', 'coverage']
       )
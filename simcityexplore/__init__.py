@@ -16,11 +16,17 @@
 
 from .parameter import (parse_parameter_spec, ParameterSpec, ChoiceSpec,
                         IntervalSpec, StringSpec, parse_parameters)
-from .ensemble import ensemble_view
+from .ensemble import (ensemble_view, sync_views, ensemble_summary_view,
+                       ensemble_summary, ensemble_summaries, iter_tasks)
 
 __all__ = [
     'parse_parameter_spec', 'ParameterSpec', 'ChoiceSpec', 'IntervalSpec',
     'StringSpec',
     'parse_parameters',
     'ensemble_view',
+    'sync_views',
+    'ensemble_summary_view',
+    'ensemble_summary',
+    'ensemble_summaries',
+    'iter_tasks',
 ]
@@ -0,0 +1,249 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function, division
+from .sampler import BatchSampler
+import numpy as np
+
+
+class _Cell(object):
+
+    """
+    Node of a kd-tree over the unit cube. A leaf keeps the points and scores
+    that fell in it and the row of its statistics in the AdaptiveSampler.
+    """
+
+    def __init__(self, lower, upper, index):
+        self.lower = lower
+        self.upper = upper
+        self.index = index
+        self.dim = None
+        self.split_at = None
+        self.children = None
+        self.points = []
+        self.values = []
+
+    def child(self, u):
+        return self.children[int(u[self.dim] >= self.split_at)]
+
+
+class AdaptiveSampler(BatchSampler):
+
+    """
+    Adaptive sampling of the score of a Simulator, refining where the score
+    varies most.
+
+    The search space is the unit cube, mapped to simulator input by the
+    `choose` method of each parameter spec, and is partitioned by a
+    kd-tree. After an initial latin hypercube design (see
+    `simcityexplore.sampler.BatchSampler`), each new point is
+    drawn uniformly from the cell with the highest priority, its volume
+    times the standard deviation of the scores in it divided by its number
+    of finished and running points plus one, so that cells where the score
+    is flat get few points. Cells with fewer than two scores have the
+    standard deviation of the cell they were split from. To keep sampling
+    the whole space, `exploration` times the standard deviation of all
+    scores is added to that of each cell. A cell with `split_points` scores
+    is split in half, along the dimension in which the mean score of the
+    two halves differs most, unless the halves would be narrower than
+    `min_width`. The statistics of each cell are updated as each result
+    comes in. Failed simulations count towards the budget but are not
+    used.
+
+    Arguments:
+        simulator: a Simulator whose score is sampled
+        parameter_specs: specs with a `choose` method, one per argument
+        batch_size: number of points to simulate concurrently
+        initial_points: size of the initial design, by default twice the
+            batch size and at least the number of dimensions plus one
+        split_points: number of scores in a cell before it is split
+        min_width: smallest width of a cell in the unit cube
+        exploration: weight of the overall standard deviation
+        seed: seed of the random number generator
+    """
+
+    def __init__(self, simulator, parameter_specs, batch_size=None,
+                 initial_points=None, split_points=10, min_width=1e-3,
+                 exploration=0.01, seed=None):
+        super(AdaptiveSampler, self).__init__(
+            simulator, parameter_specs, batch_size, initial_points, seed)
+        self.split_points = max(split_points, 2)
+        self.min_width = min_width
+        self.exploration = exploration
+
+        self.root = _Cell(np.zeros(self.ndim), np.ones(self.ndim), 0)
+        self.leaves = [self.root]
+        # statistics of each leaf, by index, grown as cells are split
+        self._volume = np.ones(1)
+        self._count = np.zeros(1)
+        self._mean = np.zeros(1)
+        self._m2 = np.zeros(1)
+        self._running = np.zeros(1)
+        self._prior_var = np.full(1, np.inf)
+        # statistics of all scores
+        self.count = 0
+        self.mean = 0.0
+        self._total_m2 = 0.0
+
+    def leaf(self, u):
+        ''' Leaf cell that contains point u of the unit cube. '''
+        cell = self.root
+        while cell.children is not None:
+            cell = cell.child(u)
+        return cell
+
+    def cells(self):
+        '''
+        Current partition of the unit cube.
+
+        Returns:
+            a list with the lower and upper corner, number of scores, mean
+            score and variance of the scores of each leaf cell; the
+            variance is NaN for cells with fewer than two scores
+        '''
+        result = []
+        for cell in self.leaves:
+            i = cell.index
+            n = self._count[i]
+            variance = self._m2[i] / (n - 1) if n >= 2 else np.nan
+            result.append((cell.lower, cell.upper, int(n),
+                           self._mean[i] if n > 0 else np.nan, variance))
+        return result
+
+    def priorities(self):
+        ''' Priority of each leaf, by index. '''
+        n = self._count[:len(self.leaves)]
+        variance = np.where(n >= 2, self._m2[:len(n)] / np.maximum(n - 1, 1),
+                            self._prior_var[:len(n)])
+        std = np.sqrt(self._total_m2 / (self.count - 1)
+                      if self.count >= 2 else 0)
+        if std == 0:
+            std = 1.0
+        return (self._volume[:len(n)] *
+                (np.sqrt(variance) + self.exploration * std) /
+                (n + self._running[:len(n)] + 1))
+
+    def propose(self, n):
+        ''' Choose n points of the unit cube to simulate next. '''
+        priority = self.priorities()
+        running = self._running[:len(priority)] + self._count[:len(priority)]
+        chosen = []
+        for _ in range(n):
+            i = np.argmax(priority)
+            cell = self.leaves[i]
+            chosen.append(cell.lower + (cell.upper - cell.lower) *
+                          self.random.rand(self.ndim))
+            # the same cell is chosen again only if it still has priority
+            priority[i] *= (running[i] + 1) / (running[i] + 2)
+            running[i] += 1
+        return np.array(chosen)
+
+    def _start(self, u):
+        super(AdaptiveSampler, self)._start(u)
+        self._running[self.leaf(u).index] += 1
+
+    def _finished(self, u, value):
+        self._running[self.leaf(u).index] -= 1
+        self.add(u, value)
+
+    def add(self, u, value):
+        '''
+        Update the statistics of the cell of point u with its score, and
+        split the cell once it has enough scores.
+        '''
+        cell = self.leaf(u)
+        i = cell.index
+        if isinstance(value, Exception):
+            return
+        value = float(value)
+        # Welford's algorithm
+        self._count[i] += 1
+        delta = value - self._mean[i]
+        self._mean[i] += delta / self._count[i]
+        self._m2[i] += delta * (value - self._mean[i])
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._total_m2 += delta * (value - self.mean)
+
+        cell.points.append(u)
+        cell.values.append(value)
+        if len(cell.values) >= self.split_points:
+            self._split(cell)
+
+    def _split(self, cell):
+        width = cell.upper - cell.lower
+        middle = (cell.lower + cell.upper) / 2
+        points = np.array(cell.points)
+        values = np.array(cell.values)
+        # difference of the mean score of both halves of each dimension
+        change = np.full(self.ndim, -np.inf)
+        for d in np.flatnonzero(width / 2 >= self.min_width):
+            upper = points[:, d] >= middle[d]
+            if np.all(upper) or not np.any(upper):
+                change[d] = 0
+            else:
+                change[d] = abs(np.mean(values[upper]) -
+                                np.mean(values[~upper]))
+        if np.all(np.isinf(change)):
+            return
+        # widest dimension if the score does not change
+        d = np.argmax(change + 1e-12 * width)
+
+        if len(self.leaves) == len(self._volume):
+            self._grow()
+        i = cell.index
+        j = len(self.leaves)
+        lower_upper = cell.upper.copy()
+        lower_upper[d] = middle[d]
+        upper_lower = cell.lower.copy()
+        upper_lower[d] = middle[d]
+        cell.dim = d
+        cell.split_at = middle[d]
+        cell.children = (_Cell(cell.lower, lower_upper, i),
+                         _Cell(upper_lower, cell.upper, j))
+        self.leaves[i] = cell.children[0]
+        self.leaves.append(cell.children[1])
+
+        # the lower half takes the place of the cell
+        volume = self._volume[i] / 2
+        variance = self._m2[i] / (self._count[i] - 1)
+        upper = points[:, d] >= middle[d]
+        for child, half in zip(cell.children, (~upper, upper)):
+            k = child.index
+            child.points = [u for u, h in zip(cell.points, half) if h]
+            child.values = list(values[half])
+            n = len(child.values)
+            self._volume[k] = volume
+            self._count[k] = n
+            self._mean[k] = np.mean(child.values) if n > 0 else 0
+            self._m2[k] = np.sum((values[half] - self._mean[k]) ** 2)
+            self._prior_var[k] = variance
+            self._running[k] = 0
+        # points that are running in either half
+        for u in self.pending.values():
+            leaf = self.leaf(u)
+            if leaf in cell.children:
+                self._running[leaf.index] += 1
+        cell.points = None
+        cell.values = None
+
+    def _grow(self):
+        ''' Double the capacity of the statistics arrays. '''
+        for name in ('_volume', '_count', '_mean', '_m2', '_running',
+                     '_prior_var'):
+            a = getattr(self, name)
+            setattr(self, name, np.concatenate((a, np.zeros(len(a)))))
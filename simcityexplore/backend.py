@@ -0,0 +1,384 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from numbers import Number
+from random import Random
+import multiprocessing as mp
+import subprocess
+import tempfile
+import json
+import time
+import signal
+import os
+import uuid
+
+
+class TaskCancelled(EnvironmentError):
+    pass
+
+
+class Backend(object):
+
+    """
+    Execution backend of a Simulator.
+
+    A backend submits task properties (command, version, input and
+    ensemble) for execution and returns a task object that can be scored.
+    Returned tasks support `id`, `has_error()`, `get_errors()` and
+    `get_attachment(name)`.
+    """
+
+    def init_process(self):
+        """ Called in each simulator process before the first task. """
+        pass
+
+    def submit(self, properties, host, max_jobs):
+        """ Submit a task for execution and return it. """
+        raise NotImplementedError
+
+    def get_task(self, task_id):
+        """ Get a task that was submitted earlier. """
+        raise NotImplementedError
+
+    def wait(self, task, polling_time, cancelled=None):
+        """
+        Block until given task has finished and return its new state. If the
+        `cancelled` event is set while waiting, the task is cancelled.
+        """
+        raise NotImplementedError
+
+    def cancel(self, task):
+        """ Stop given task from running, or prevent it from starting. """
+        raise NotImplementedError
+
+    def find_cached(self, command, version, kwargs):
+        """ Return a finished task with the same input, or None. """
+        return None
+
+    def run_task(self, properties, host, max_jobs, polling_time):
+        return self.wait(self.submit(properties, host, max_jobs),
+                         polling_time)
+
+
+class SimCityBackend(Backend):
+
+    """
+    Run tasks through the SIM-CITY task database and infrastructure. The
+    simcity and picas packages are imported when they are first used.
+    """
+
+    def init_process(self):
+        import simcity
+        # reinitialize database connections in each process
+        simcity.init(simcity.get_config())
+
+    def submit(self, properties, host, max_jobs):
+        import simcity
+        task = simcity.add_task(properties)
+        simcity.submit_if_needed(host, max_jobs)
+        return task
+
+    def get_task(self, task_id):
+        import simcity
+        return simcity.get_task(task_id)
+
+    def wait(self, task, polling_time, cancelled=None):
+        import simcity
+        while task['done'] == 0 and not task.has_error():
+            if cancelled is None:
+                time.sleep(polling_time)
+            elif cancelled.wait(polling_time):
+                self.cancel(task)
+            task = simcity.get_task(task.id)
+        return task
+
+    def cancel(self, task):
+        import simcity
+        # a running job cannot be stopped, but its result will be ignored
+        task = simcity.get_task(task.id)
+        if task['done'] == 0 and not task.has_error():
+            task.error('cancelled')
+            simcity.get_task_database().save(task)
+
+    def find_cached(self, command, version, kwargs):
+        import simcity
+        from picas.documents import Task
+        js_input = ""
+        for key in kwargs:
+            if isinstance(kwargs[key], Number):
+                js_input += "&& doc.input['%s'] == %f" % (key, kwargs[key])
+            else:
+                js_input += "&& doc.input['%s'] == '%s'" % (
+                    key, str(kwargs[key]))
+
+        map_fun = '''function(doc) {
+            if (doc.type == 'task' && doc.done > 0 &&
+                doc.command == '%s' && doc.version == '%s' %s) {
+                emit(doc._id, doc)
+            }
+        }''' % (command, version, js_input)
+        for row in simcity.get_task_database().db.query(map_fun, limit=1):
+            return Task(row.value)
+        return None
+
+
+class LocalTask(object):
+
+    """
+    Task executed by the LocalBackend.
+
+    Files written to the output directory take the place of database
+    attachments.
+    """
+
+    def __init__(self, task_id, directory, properties):
+        self.id = task_id
+        self.directory = directory
+        self.properties = properties
+        self.errors = []
+        self.lock = 0
+        self.done = 0
+
+    @property
+    def input_dir(self):
+        return os.path.join(self.directory, 'input')
+
+    @property
+    def tmp_dir(self):
+        return os.path.join(self.directory, 'tmp')
+
+    @property
+    def output_dir(self):
+        return os.path.join(self.directory, 'output')
+
+    def __getitem__(self, key):
+        if key == 'lock':
+            return self.lock
+        if key == 'done':
+            return self.done
+        if key == 'error':
+            return self.errors
+        return self.properties[key]
+
+    def has_error(self):
+        return len(self.errors) > 0
+
+    def get_errors(self):
+        return self.errors
+
+    def list_attachments(self):
+        return sorted(os.listdir(self.output_dir))
+
+    def get_attachment(self, name, retrieve_from_database=None):
+        with open(os.path.join(self.output_dir, name), 'rb') as f:
+            return {'data': f.read()}
+
+
+class LocalBackend(Backend):
+
+    """
+    Run tasks as subprocesses on the local machine.
+
+    Like a SIM-CITY worker, the command is called with an input, temporary
+    and output directory as arguments, and the task input is available as
+    `input.json` in the input directory. Commands do not outlive the
+    simulator process that runs them, so a task that is reattached with
+    `get_task` is run again. At most `max_processes` commands
+    run at the same time, shared by all simulator processes. The `host` and
+    `max_jobs` arguments of the simulator are ignored.
+    """
+
+    def __init__(self, directory=None, max_processes=None):
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='simcityexplore-')
+        if max_processes is None:
+            max_processes = mp.cpu_count()
+        self.directory = directory
+        self.max_processes = max_processes
+        self.slots = mp.BoundedSemaphore(max_processes)
+
+    def submit(self, properties, host, max_jobs):
+        task_id = 'task_' + uuid.uuid4().hex
+        task = LocalTask(task_id, os.path.join(self.directory, task_id),
+                         properties)
+        for path in (task.input_dir, task.tmp_dir, task.output_dir):
+            os.makedirs(path)
+        with open(os.path.join(task.input_dir, 'input.json'), 'w') as f:
+            json.dump(properties.get('input', {}), f)
+        with open(os.path.join(task.directory, 'task.json'), 'w') as f:
+            json.dump(properties, f)
+        return task
+
+    def get_task(self, task_id):
+        directory = os.path.join(self.directory, task_id)
+        with open(os.path.join(directory, 'task.json')) as f:
+            properties = json.load(f)
+        for name in ('cancelled', 'pid'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+        return LocalTask(task_id, directory, properties)
+
+    def wait(self, task, polling_time, cancelled=None):
+        command = os.path.expanduser(task['command'])
+        while not self.slots.acquire(True, 0.1):
+            if self._is_cancelled(task, cancelled):
+                task.errors.append('cancelled')
+                task.done = -1
+                return task
+
+        task.lock = time.time()
+        try:
+            with open(os.path.join(task.directory, 'stdout'), 'w') as out:
+                with open(os.path.join(task.directory, 'stderr'), 'w') as err:
+                    proc = subprocess.Popen(
+                        [command, task.input_dir, task.tmp_dir,
+                         task.output_dir],
+                        stdout=out, stderr=err, cwd=task.tmp_dir,
+                        preexec_fn=os.setsid)
+                    with open(os.path.join(task.directory, 'pid'), 'w') as f:
+                        f.write(str(proc.pid))
+                    while proc.poll() is None:
+                        if self._is_cancelled(task, cancelled):
+                            self._kill(proc.pid)
+                        time.sleep(0.1)
+                    returncode = proc.returncode
+        except OSError as ex:
+            task.errors.append('Command %s could not be started: %s'
+                               % (command, str(ex)))
+        else:
+            if self._is_cancelled(task, cancelled):
+                task.errors.append('cancelled')
+            elif returncode != 0:
+                task.errors.append('Command %s exited with code %d'
+                                   % (command, returncode))
+        finally:
+            self.slots.release()
+
+        task.done = -1 if task.has_error() else time.time()
+        return task
+
+    def cancel(self, task):
+        with open(os.path.join(task.directory, 'cancelled'), 'w'):
+            pass
+        try:
+            with open(os.path.join(task.directory, 'pid')) as f:
+                self._kill(int(f.read()))
+        except (IOError, OSError, ValueError):
+            pass
+
+    def _is_cancelled(self, task, cancelled):
+        return ((cancelled is not None and cancelled.is_set()) or
+                os.path.exists(os.path.join(task.directory, 'cancelled')))
+
+    def _kill(self, pid):
+        try:
+            os.killpg(pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+
+class FakeTask(LocalTask):
+
+    """
+    Task of the FakeBackend. Its only attachment, 'input.json', holds the
+    task input.
+    """
+
+    def __init__(self, task_id, properties):
+        super(FakeTask, self).__init__(task_id, None, properties)
+
+    def list_attachments(self):
+        return ['input.json']
+
+    def get_attachment(self, name, retrieve_from_database=None):
+        if name != 'input.json':
+            raise KeyError(name)
+        return {'data': json.dumps(self.properties.get('input', {}))
+                .encode('utf-8')}
+
+
+class FakeBackend(Backend):
+
+    """
+    Run no tasks, but let them take time and fail as configured, to measure
+    the overhead of a Simulator without a cluster.
+
+    Each task runs for `latency` seconds, or for an exponentially
+    distributed time with that mean if `distribution` is 'exponential',
+    and fails with probability `failure_rate`. A finished task is only
+    noticed after a whole polling period, as with the SIM-CITY backend.
+    `init_time` seconds are spent initializing each simulator process, in
+    place of connecting to the task database. The outcome of a task is
+    determined by `seed` and its input, so that runs with the same seed
+    are reproducible whichever process runs each task; tasks with the same
+    input have the same outcome. Tasks only exist in the process that
+    submitted them, so `get_task` cannot reattach to tasks of an earlier
+    session.
+    """
+
+    def __init__(self, latency=0, distribution='fixed', failure_rate=0,
+                 init_time=0, seed=None):
+        if distribution not in ('fixed', 'exponential'):
+            raise ValueError('Latency distribution %s is not fixed or '
+                             'exponential' % distribution)
+        self.latency = latency
+        self.distribution = distribution
+        self.failure_rate = failure_rate
+        self.init_time = init_time
+        self.seed = seed
+        self.tasks = {}
+
+    def init_process(self):
+        time.sleep(self.init_time)
+
+    def submit(self, properties, host, max_jobs):
+        task = FakeTask('task_' + uuid.uuid4().hex, properties)
+        self.tasks[task.id] = task
+        return task
+
+    def get_task(self, task_id):
+        return self.tasks[task_id]
+
+    def wait(self, task, polling_time, cancelled=None):
+        random = Random('{0}-{1}'.format(self.seed, json.dumps(
+            task.properties.get('input', {}), sort_keys=True)))
+        if self.distribution == 'exponential' and self.latency > 0:
+            duration = random.expovariate(1.0 / self.latency)
+        else:
+            duration = self.latency
+        task.lock = time.time()
+        finished = task.lock + duration
+        while not task.has_error():
+            remaining = finished - time.time()
+            if remaining <= 0:
+                break
+            if polling_time > 0:
+                remaining = polling_time
+            if cancelled is None:
+                time.sleep(remaining)
+            elif cancelled.wait(remaining):
+                self.cancel(task)
+
+        if not task.has_error() and random.random() < self.failure_rate:
+            task.errors.append('Task %s failed' % task.id)
+        task.done = -1 if task.has_error() else finished
+        return task
+
+    def cancel(self, task):
+        if not task.has_error():
+            task.errors.append('cancelled')
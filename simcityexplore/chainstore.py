@@ -0,0 +1,167 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import json
+import os
+
+DTYPE = np.dtype('<f8')
+
+
+class ChainStore(object):
+
+    """
+    Append-only on-disk storage of the chain of a PTSampler.
+
+    Each stored step of the positions, log-probabilities, log-likelihoods
+    and acceptance fractions of all walkers is appended to a raw binary
+    file in `directory`, so the chain does not have to fit in memory. The
+    number of complete steps is kept in `chain.json` and only updated after
+    a step has been written, so a step that was partially written during a
+    crash is discarded when the store is opened again. Reads are
+    memory-mapped, and only the slices that are used are loaded.
+
+    An existing store is opened for appending; its shape must match the
+    given shape, which may be omitted.
+    """
+
+    FIELDS = ('chain', 'lnprobability', 'lnlikelihood', 'acceptance')
+
+    def __init__(self, directory, ntemps=None, nwalkers=None, ndim=None,
+                 sync=True):
+        self.directory = directory
+        self.sync = sync
+        shape = (ntemps, nwalkers, ndim)
+        try:
+            with open(self._path('chain.json')) as f:
+                metadata = json.load(f)
+        except IOError:
+            if None in shape:
+                raise ValueError('Chain store %s does not exist; give its '
+                                 'shape to create it' % directory)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.ntemps, self.nwalkers, self.ndim = shape
+            self.nsteps = 0
+            self.clear()
+        else:
+            self.ntemps = metadata['ntemps']
+            self.nwalkers = metadata['nwalkers']
+            self.ndim = metadata['ndim']
+            self.nsteps = metadata['nsteps']
+            for given, stored in zip(shape, (self.ntemps, self.nwalkers,
+                                             self.ndim)):
+                if given is not None and given != stored:
+                    raise ValueError('Chain store %s has shape %s'
+                                     % (directory, str((self.ntemps,
+                                                        self.nwalkers,
+                                                        self.ndim))))
+            self._truncate()
+
+    def __len__(self):
+        return self.nsteps
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _step_shape(self, field):
+        if field == 'chain':
+            return (self.ntemps, self.nwalkers, self.ndim)
+        return (self.ntemps, self.nwalkers)
+
+    def _step_size(self, field):
+        return int(np.prod(self._step_shape(field))) * DTYPE.itemsize
+
+    def _truncate(self):
+        for field in self.FIELDS:
+            with open(self._path(field + '.bin'), 'ab') as f:
+                f.truncate(self.nsteps * self._step_size(field))
+
+    def _write_metadata(self):
+        path = self._path('chain.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'ntemps': self.ntemps, 'nwalkers': self.nwalkers,
+                       'ndim': self.ndim, 'nsteps': self.nsteps}, f)
+            if self.sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.rename(path + '.tmp', path)
+
+    def clear(self):
+        ''' Remove all stored steps. '''
+        self.truncate(0)
+
+    def truncate(self, nsteps):
+        '''
+        Remove the steps after the first `nsteps`, for example those stored
+        after the checkpoint that sampling is resumed from.
+        '''
+        self.nsteps = min(nsteps, self.nsteps)
+        self._truncate()
+        self._write_metadata()
+
+    def append(self, p, lnprob, lnlike, acceptance):
+        ''' Store a step of all walkers. '''
+        for field, value in zip(self.FIELDS, (p, lnprob, lnlike, acceptance)):
+            value = np.asarray(value, dtype=DTYPE).reshape(
+                self._step_shape(field))
+            with open(self._path(field + '.bin'), 'ab') as f:
+                f.write(value.tobytes())
+                if self.sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        self.nsteps += 1
+        self._write_metadata()
+
+    def _read(self, field):
+        shape = (self.nsteps,) + self._step_shape(field)
+        if self.nsteps == 0:
+            values = np.empty(shape, dtype=DTYPE)
+        else:
+            values = np.memmap(self._path(field + '.bin'), dtype=DTYPE,
+                               mode='r', shape=shape)
+        # steps last, as in PTSampler
+        return np.rollaxis(values, 0, len(shape))
+
+    @property
+    def chain(self):
+        ''' Stored positions, as (ntemps, nwalkers, nsteps, ndim). '''
+        return np.rollaxis(self._read('chain'), 3, 2)
+
+    @property
+    def lnprobability(self):
+        ''' Stored log-probabilities, as (ntemps, nwalkers, nsteps). '''
+        return self._read('lnprobability')
+
+    @property
+    def lnlikelihood(self):
+        ''' Stored log-likelihoods, as (ntemps, nwalkers, nsteps). '''
+        return self._read('lnlikelihood')
+
+    @property
+    def acceptance_fraction(self):
+        '''
+        Acceptance fraction of each walker when each step was stored, as
+        (ntemps, nwalkers, nsteps).
+        '''
+        return self._read('acceptance')
+
+    def samples(self, temperature, dimension):
+        '''
+        Stored values of one dimension at one temperature, of all walkers,
+        loading only those values.
+        '''
+        return np.array(self.chain[temperature, :, :, dimension]).ravel()
@@ -0,0 +1,93 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import json
+import os
+
+COUNTERS = ('nprop', 'nprop_accepted', 'nswap', 'nswap_accepted',
+            'nscreened')
+
+
+def _random_state(random):
+    name, keys, pos, has_gauss, cached_gaussian = random.get_state()
+    return keys, [name, int(pos), int(has_gauss), float(cached_gaussian)]
+
+
+def save_checkpoint(path, sampler, p, lnprob, lnlike, **info):
+    '''
+    Save the state of a PTSampler after a step, so that sampling can be
+    continued with `load_checkpoint`.
+
+    The checkpoint holds the walkers, the acceptance counters, the state of
+    the random number generators, the points the surrogate was trained on
+    and the results that the simulator has in memory (see the `memoize`
+    option of Simulator). Extra keyword arguments, for example the
+    iteration of the driver, are stored as JSON. The previous checkpoint is
+    only replaced once the new one has been written.
+    '''
+    randoms = [sampler.random] + list(sampler.temperature_random)
+    keys, states = zip(*[_random_state(r) for r in randoms])
+    metadata = {
+        'info': info,
+        'random': states,
+        'nsimulated': sampler.nsimulated,
+        'train_surrogate': sampler.train_surrogate,
+        'evaluated': sampler.simulator.evaluated,
+    }
+    arrays = dict((name, getattr(sampler, name)) for name in COUNTERS)
+    if sampler.surrogate is not None and len(sampler.surrogate) > 0:
+        arrays['surrogate_x'] = sampler.surrogate.x
+        arrays['surrogate_y'] = sampler.surrogate.y
+
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, p=p, lnprob=lnprob, lnlike=lnlike, betas=sampler.betas,
+                 random_keys=np.array(keys),
+                 metadata=np.array(json.dumps(metadata)), **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(path + '.tmp', path)
+
+
+def load_checkpoint(path, sampler):
+    '''
+    Restore a PTSampler, and the results in memory of its simulator, from a
+    checkpoint written by `save_checkpoint`. The chain itself is not part of
+    the checkpoint; keep it in a ChainStore.
+
+    Returns:
+        the positions, log-probabilities and log-likelihoods of the walkers,
+        to continue sampling from, and a dict of the extra information that
+        was saved.
+    '''
+    with np.load(path) as data:
+        metadata = json.loads(str(data['metadata']))
+        sampler.betas = data['betas']
+        for name in COUNTERS:
+            setattr(sampler, name, data[name])
+        randoms = [sampler.random] + list(sampler.temperature_random)
+        for random, keys, state in zip(randoms, data['random_keys'],
+                                       metadata['random']):
+            random.set_state((state[0], keys) + tuple(state[1:]))
+        if 'surrogate_x' in data:
+            for x, y in zip(data['surrogate_x'], data['surrogate_y']):
+                sampler.surrogate.add(x, y)
+        p, lnprob, lnlike = data['p'], data['lnprob'], data['lnlike']
+
+    sampler.nsimulated = metadata['nsimulated']
+    sampler.train_surrogate = metadata['train_surrogate']
+    sampler.simulator.evaluated.update(metadata['evaluated'])
+    return p, lnprob, lnlike, metadata['info']
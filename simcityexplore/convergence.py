@@ -0,0 +1,142 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+import numpy as np
+
+
+class ConvergenceMonitor(object):
+
+    """
+    Online convergence diagnostics of an ensemble of walkers.
+
+    Each walker is treated as a separate chain. Adding a step costs
+    O(max_lag) per walker and dimension, whatever the length of the chain:
+    the mean and variance of each walker are updated with Welford's method,
+    and for each lag up to `max_lag` the sum of lagged products is updated.
+    The last `max_lag` steps are kept to correct these sums for the mean.
+
+    The integrated autocorrelation time is estimated from the autocorrelation
+    function averaged over walkers, summed up to the smallest lag M with
+    M >= `window` * tau (Sokal's automated windowing). It cannot be estimated
+    beyond `max_lag` / `window`, so choose `max_lag` accordingly.
+    """
+
+    def __init__(self, nwalkers, ndim, max_lag=100, window=5):
+        self.nwalkers = nwalkers
+        self.ndim = ndim
+        self.max_lag = max_lag
+        self.window = window
+        shape = (nwalkers, ndim)
+        self.n = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.total = np.zeros(shape)
+        # sums of x[t] * x[t - k] for each lag k
+        self.lagsum = np.zeros((max_lag,) + shape)
+        # sums of the first k steps, for each lag k
+        self.head = np.zeros((max_lag,) + shape)
+        self.recent = np.zeros((max_lag,) + shape)
+
+    def __len__(self):
+        return self.n
+
+    def add(self, x):
+        ''' Add a step, the positions of all walkers. '''
+        x = np.asarray(x, dtype=float).reshape((self.nwalkers, self.ndim))
+        n = self.n
+        if n + 1 < self.max_lag:
+            self.head[n + 1] = self.head[n] + x
+        self.recent[n % self.max_lag] = x
+        nlags = min(n + 1, self.max_lag)
+        lagged = self.recent[(n - np.arange(nlags)) % self.max_lag]
+        self.lagsum[:nlags] += lagged * x
+        self.total += x
+
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def autocovariance(self):
+        '''
+        Autocovariance of each walker at lags 0 to min(n, max_lag) - 1, as
+        (lags, nwalkers, ndim).
+        '''
+        nlags = min(self.n, self.max_lag)
+        lags = np.arange(nlags)
+        # sums of the last k steps, for each lag k
+        last = self.recent[(self.n - 1 - lags) % self.max_lag]
+        tail = np.concatenate((np.zeros((1, self.nwalkers, self.ndim)),
+                               np.cumsum(last, axis=0)[:-1]))
+        count = (self.n - lags)[:, np.newaxis, np.newaxis]
+        mu = self.mean
+        return (self.lagsum[:nlags] -
+                mu * (2 * self.total - self.head[:nlags] - tail) +
+                count * mu ** 2) / count
+
+    def autocorrelation_time(self):
+        ''' Integrated autocorrelation time of each dimension. '''
+        if self.n < 2:
+            return np.full(self.ndim, np.inf)
+        acov = np.mean(self.autocovariance(), axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rho = acov / acov[0]
+        taus = 2 * np.cumsum(rho, axis=0) - 1
+        tau = np.empty(self.ndim)
+        for i in range(self.ndim):
+            outside = np.arange(len(taus)) >= self.window * taus[:, i]
+            if np.any(outside):
+                tau[i] = taus[np.argmax(outside), i]
+            else:
+                tau[i] = taus[-1, i]
+        return tau
+
+    def effective_sample_size(self):
+        ''' Number of independent samples of each dimension. '''
+        return self.nwalkers * self.n / self.autocorrelation_time()
+
+    def gelman_rubin(self):
+        '''
+        Potential scale reduction factor R-hat of each dimension, comparing
+        the variance between walkers to the variance within walkers.
+        '''
+        if self.n < 2:
+            return np.full(self.ndim, np.inf)
+        within = np.mean(self.m2 / (self.n - 1), axis=0)
+        between = np.var(self.mean, axis=0, ddof=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pooled = (self.n - 1) / self.n * within + between
+            return np.sqrt(pooled / within)
+
+    def converged(self, max_rhat=None, min_ess=None, tau_factor=None):
+        '''
+        Whether all given criteria are met in all dimensions: R-hat at most
+        `max_rhat`, an effective sample size of at least `min_ess` and a
+        chain of at least `tau_factor` autocorrelation times.
+        '''
+        if self.n < 2:
+            return False
+        if max_rhat is not None and np.any(
+                ~(self.gelman_rubin() <= max_rhat)):
+            return False
+        tau = self.autocorrelation_time()
+        if min_ess is not None and np.any(
+                ~(self.nwalkers * self.n / tau >= min_ess)):
+            return False
+        if tau_factor is not None and np.any(~(self.n >= tau_factor * tau)):
+            return False
+        return True
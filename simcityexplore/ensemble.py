@@ -14,48 +14,362 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import picas
+import threading
+import hashlib
+import json
+try:
+    from queue import Queue, Full
+except ImportError:
+    from Queue import Queue, Full
 
+# state of a task document, as used in the views
+TASK_STATE_FUN = '''
+        var state = "todo";
+        if (doc.error && doc.error.length > 0) {
+          state = "error";
+        } else if (doc.done > 0) {
+          state = "done";
+        } else if (doc.lock > 0) {
+          state = "locked";
+        }'''
 
-class Ensemble(picas.Document):
+# time at which a finished task finished; other tasks are not emitted
+FINISH_TIME_FUN = TASK_STATE_FUN + '''
+        if (state !== "done" && state !== "error") {
+          return;
+        }
+        var finished = doc.done;
+        if (state === "error") {
+          finished = doc.error[doc.error.length - 1].time || 0;
+        }'''
+
+
+class Ensemble(object):
+
+    """ A named set of tasks of a simulation, with its parameter specs. """
 
     def __init__(self, name, parameter_specs):
         self.name = name
         self.specs = parameter_specs
 
 
-def ensemble_view(task_db, name, version, url, ensemble = None):
+def ensemble_view(task_db, name, version, url, ensemble=None, by='name'):
+    '''
+    Make sure the views of the tasks of a simulation version, or of one of
+    its ensembles, exist and are up to date (see sync_views).
+
+    Arguments:
+        by: the task field that `name` is matched against; 'name', or
+            'command' for the tasks that a Simulator submits
+
+    Returns:
+        the name of the design document
+    '''
+    if by == 'name':
+        prefix = name
+    elif by == 'command':
+        # commands are paths, which are not valid in a document id
+        prefix = 'command_' + hashlib.sha1(
+            name.encode('utf-8')).hexdigest()[:16]
+    else:
+        raise ValueError("Tasks are matched by 'name' or 'command'")
     if ensemble is None:
-        design_doc = '{0}_{1}'.format(name, version)
+        design_doc = '{0}_{1}'.format(prefix, version)
         ensemble_condition = ''
     else:
-        design_doc = '{0}_{1}_{2}'.format(name, version, ensemble)
+        design_doc = '{0}_{1}_{2}'.format(prefix, version, ensemble)
         ensemble_condition = ' && doc.ensemble === "{0}"'.format(ensemble)
 
-    doc_id = '_design/{0}'.format(design_doc)
-    try:
-        task_db.get(doc_id)
-    except:
-        if not url.endswith('/'):
-            url = url + '/'
+    if not url.endswith('/'):
+        url = url + '/'
 
-        map_fun = '''
+    map_fun = '''
     function(doc) {{
-      if (doc.type === "task" && doc.name === "{name}" &&
-          doc.version === "{version}"{ensemble_condition}) {{
-        emit(doc._id, {{
+      if (doc.type === "task" && doc.{by} === {name} &&
+          doc.version === "{version}"{ensemble_condition}) {{{state_fun}
+        emit({key}, {{
           id: doc._id,
           rev: doc._rev,
           url: "{url}/" + doc._id,
           error: doc.error,
           lock: doc.lock,
           done: doc.done,
+          command: doc.command,
+          version: doc.version,
           input: doc.input
         }});
       }}
-    }}'''.format(name=name, version=version,
-                 ensemble_condition=ensemble_condition, url=url)
+    }}'''
+    views = {
+        'all_docs': map_fun.format(
+            by=by, name=json.dumps(name), version=version,
+            ensemble_condition=ensemble_condition,
+            url=url, state_fun='', key='doc._id'),
+        'by_state': map_fun.format(
+            by=by, name=json.dumps(name), version=version,
+            ensemble_condition=ensemble_condition,
+            url=url, state_fun=TASK_STATE_FUN, key='[state, doc._id]'),
+        'finished': map_fun.format(
+            by=by, name=json.dumps(name), version=version,
+            ensemble_condition=ensemble_condition,
+            url=url, state_fun=FINISH_TIME_FUN, key='[finished, doc._id]'),
+    }
+    sync_views(task_db, design_doc, views)
+    return design_doc
 
-        task_db.add_view('all_docs', map_fun, design_doc=design_doc)
 
-    return design_doc
+# content hash of each design document known to be up to date, by database
+_design_docs = {}
+
+
+def sync_views(task_db, design_doc, views, reduce_funs=None):
+    '''
+    Create or update a design document with given views, a dict of map
+    functions by view name, and given reduce functions. A hash of the views
+    is stored in the design document, and the document is only replaced
+    when the hash differs, which rebuilds its views. Views that are known to
+    be up to date are not requested from the database again.
+    '''
+    if reduce_funs is None:
+        reduce_funs = {}
+    definitions = {}
+    for view, map_fun in views.items():
+        definitions[view] = {'map': map_fun}
+        if view in reduce_funs:
+            definitions[view]['reduce'] = reduce_funs[view]
+    digest = hashlib.sha1(json.dumps(definitions, sort_keys=True)
+                          .encode('utf-8')).hexdigest()
+
+    key = (id(task_db.db), design_doc)
+    try:
+        if _design_docs[key][1] == digest:
+            return
+    except KeyError:
+        pass
+
+    doc_id = '_design/{0}'.format(design_doc)
+    doc = task_db.db.get(doc_id)
+    if doc is None or doc.get('content_hash') != digest:
+        if doc is None:
+            doc = {'_id': doc_id}
+        doc['language'] = 'javascript'
+        doc['views'] = definitions
+        doc['content_hash'] = digest
+        try:
+            task_db.db.save(doc)
+        except Exception:
+            # another process may have updated it at the same time
+            doc = task_db.db.get(doc_id)
+            if doc is None or doc.get('content_hash') != digest:
+                raise
+
+    # keep the database alive so that its id is not reused
+    _design_docs[key] = (task_db.db, digest)
+
+
+SUMMARY_DESIGN_DOC = 'simcityexplore_summary'
+SUMMARY_VIEW = 'ensemble_status'
+TASK_STATES = ('todo', 'locked', 'done', 'error')
+
+
+def ensemble_summary_view(task_db):
+    '''
+    Make sure the view that ensemble_summary and ensemble_summaries query
+    exists and is up to date (see sync_views). Tasks are keyed by
+    [name, version, ensemble, state] and the value is the runtime of
+    finished tasks, which the built-in _stats reducer aggregates in the
+    database.
+
+    Returns:
+        the name of the design document
+    '''
+    map_fun = '''
+    function(doc) {
+      if (doc.type === "task") {%s
+        emit([doc.name, doc.version, doc.ensemble, state],
+             state === "done" ? doc.done - doc.lock : 0);
+      }
+    }''' % TASK_STATE_FUN
+    sync_views(task_db, SUMMARY_DESIGN_DOC, {SUMMARY_VIEW: map_fun},
+               {SUMMARY_VIEW: '_stats'})
+    return SUMMARY_DESIGN_DOC
+
+
+def _summarize(rows):
+    summary = dict((state, 0) for state in TASK_STATES)
+    runtime = {'count': 0, 'sum': 0, 'sumsqr': 0, 'min': None, 'max': None}
+    for state, stats in rows:
+        summary[state] += stats['count']
+        if state != 'done':
+            continue
+        for key in ('count', 'sum', 'sumsqr'):
+            runtime[key] += stats[key]
+        for key, better in (('min', min), ('max', max)):
+            if runtime[key] is None:
+                runtime[key] = stats[key]
+            else:
+                runtime[key] = better(runtime[key], stats[key])
+
+    summary['total'] = sum(summary[state] for state in TASK_STATES)
+    if runtime['count'] > 0:
+        mean = runtime['sum'] / float(runtime['count'])
+        variance = max(runtime['sumsqr'] / float(runtime['count']) -
+                       mean ** 2, 0)
+        summary['runtime'] = {'mean': mean, 'std': variance ** 0.5,
+                              'min': runtime['min'], 'max': runtime['max']}
+    else:
+        summary['runtime'] = None
+    return summary
+
+
+def _summary_rows(task_db, name, version, ensemble=None):
+    ensemble_summary_view(task_db)
+    startkey = [name, version]
+    if ensemble is not None:
+        startkey.append(ensemble)
+    # {} sorts after all strings and numbers
+    endkey = startkey + [{}]
+    rows = task_db.db.view('{0}/{1}'.format(SUMMARY_DESIGN_DOC,
+                                            SUMMARY_VIEW),
+                           group_level=4, startkey=startkey, endkey=endkey)
+    for row in rows:
+        yield row.key[2], row.key[3], row.value
+
+
+def ensemble_summary(task_db, name, version, ensemble=None):
+    '''
+    Progress of an ensemble, or of all ensembles of a simulation version,
+    computed by the database with one small request.
+
+    Returns:
+        a dict with the number of tasks that are 'todo', 'locked', 'done',
+        and in 'error', their 'total', and the 'runtime' statistics of
+        finished tasks ('mean', 'std', 'min' and 'max' in seconds), or None
+        if no task has finished.
+    '''
+    return _summarize((state, stats) for _, state, stats
+                      in _summary_rows(task_db, name, version, ensemble))
+
+
+def ensemble_summaries(task_db, name, version):
+    '''
+    Progress of each ensemble of a simulation version, in one request.
+
+    Returns:
+        a dict of the summary of each ensemble, see ensemble_summary
+    '''
+    rows = {}
+    for ensemble, state, stats in _summary_rows(task_db, name, version):
+        rows.setdefault(ensemble, []).append((state, stats))
+    return dict((ensemble, _summarize(ensemble_rows))
+                for ensemble, ensemble_rows in rows.items())
+
+
+def iter_tasks(task_db, name, version, url, ensemble=None, state=None,
+               finished_since=None, page_size=1000, prefetch=False,
+               by='name'):
+    '''
+    Iterate over the tasks of an ensemble in pages of `page_size` rows of
+    the ensemble view (see ensemble_view), so that memory use does not
+    depend on the size of the ensemble. Each page starts at the key after
+    the previous page, which stays fast deep into the view, unlike skip.
+    With `prefetch`, the next page is requested in a thread while the
+    current page is processed.
+
+    Arguments:
+        state: only iterate over tasks that are 'todo', 'locked', 'done' or
+            in 'error'
+        finished_since: only iterate over tasks that finished, with or
+            without error, at or after this time, in order of finishing
+            (see finish_time)
+        by: the task field that `name` is matched against (see
+            ensemble_view)
+
+    Returns:
+        a generator of the view value of each task, a dict with its 'id',
+        'rev', 'url', 'error', 'lock', 'done', 'command', 'version' and
+        'input'
+    '''
+    if state is not None and finished_since is not None:
+        raise ValueError('Tasks can be filtered by state or finishing time, '
+                         'not both')
+    design_doc = ensemble_view(task_db, name, version, url, ensemble, by)
+    if state is not None:
+        view = design_doc + '/by_state'
+        startkey, endkey = [state], [state, {}]
+    elif finished_since is not None:
+        view = design_doc + '/finished'
+        startkey, endkey = [finished_since], [{}]
+    else:
+        view = design_doc + '/all_docs'
+        startkey, endkey = None, {}
+
+    pages = _view_pages(task_db.db, view, startkey, endkey, page_size)
+    if prefetch:
+        pages = _prefetch(pages)
+    for page in pages:
+        for row in page:
+            yield row.value
+
+
+def finish_time(task):
+    '''
+    Time at which a task finished: when it was done or, for a task in
+    error, when the last error occurred.
+    '''
+    if task.get('error'):
+        return task['error'][-1].get('time', 0)
+    return task['done']
+
+
+def _view_pages(db, view, startkey, endkey, page_size):
+    params = {'endkey': endkey, 'limit': page_size + 1}
+    if startkey is not None:
+        params['startkey'] = startkey
+    while True:
+        rows = list(db.view(view, **params))
+        yield rows[:page_size]
+        if len(rows) <= page_size:
+            return
+        # keys of these views are unique
+        params['startkey'] = rows[page_size].key
+
+
+def _prefetch(pages):
+    ''' Produce the next item of an iterator in a thread. '''
+    queue = Queue(1)
+    stopped = threading.Event()
+
+    def put(item):
+        # give up once the consumer has stopped
+        while not stopped.is_set():
+            try:
+                queue.put(item, True, 0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for page in pages:
+                if not put((page, None)):
+                    return
+        except Exception as ex:
+            put((None, ex))
+        else:
+            put((None, None))
+
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            page, error = queue.get()
+            if error is not None:
+                raise error
+            if page is None:
+                return
+            yield page
+    finally:
+        stopped.set()
@@ -0,0 +1,200 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+from .ensemble import iter_tasks, finish_time
+import numpy as np
+import json
+import os
+
+NUMPY_TYPES = {float: 'f8', int: 'i8', bool: '?'}
+
+
+class ExportColumns(object):
+
+    """
+    Columns of exported tasks, typed by the parameter specs of the ensemble.
+
+    Each input parameter becomes a column 'input_<name>'. Parameters with a
+    float, int or bool dtype get the corresponding NumPy type and string
+    parameters a unicode column; other parameters are stored as JSON. A
+    missing float input is NaN and other missing inputs get their default.
+    """
+
+    def __init__(self, parameter_specs):
+        self.specs = parameter_specs
+        self.clear()
+
+    def __len__(self):
+        return len(self.values['id'])
+
+    def clear(self):
+        names = ['id', 'state', 'lock', 'done', 'runtime', 'score']
+        names += ['input_' + spec.name for spec in self.specs]
+        self.values = dict((name, []) for name in names)
+
+    def add(self, task, score):
+        error = bool(task.get('error'))
+        values = self.values
+        values['id'].append(task['id'])
+        values['state'].append('error' if error else 'done')
+        values['lock'].append(float(task.get('lock', 0)))
+        values['done'].append(float(task.get('done', 0)))
+        values['runtime'].append(
+            np.nan if error else float(task['done'] - task['lock']))
+        values['score'].append(np.nan if score is None else float(score))
+        inputs = task.get('input') or {}
+        for spec in self.specs:
+            dtype = self._dtype(spec)
+            value = inputs.get(spec.name)
+            if value is None:
+                value = np.nan if dtype is float else spec.default
+            if dtype is None:
+                value = json.dumps(value)
+            values['input_' + spec.name].append(value)
+
+    def _dtype(self, spec):
+        try:
+            return spec.dtype.dtype
+        except AttributeError:
+            return None
+
+    def arrays(self):
+        arrays = {}
+        for name, values in self.values.items():
+            dtype = None
+            if name in ('lock', 'done', 'runtime', 'score'):
+                dtype = 'f8'
+            for spec in self.specs:
+                if name == 'input_' + spec.name:
+                    dtype = NUMPY_TYPES.get(self._dtype(spec))
+            if dtype is None:
+                # unicode, also on Python 2
+                values = [u'{0}'.format(v) for v in values]
+            arrays[name] = np.array(values, dtype=dtype)
+        return arrays
+
+
+def _read_state(path):
+    try:
+        with open(os.path.join(path, 'export.json')) as f:
+            return json.load(f)
+    except IOError:
+        return {'parts': [], 'latest': 0, 'complete_before': 0,
+                'recent': {}}
+
+
+def _write_state(path, state):
+    state_path = os.path.join(path, 'export.json')
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.rename(state_path + '.tmp', state_path)
+
+
+def export_ensemble(task_db, name, version, ensemble, url, path,
+                    scoring=None, overlap=3600, part_size=100000,
+                    page_size=1000):
+    '''
+    Export the finished tasks of an ensemble to columnar .npz files in the
+    directory `path`; load them with `load_export`.
+
+    The tasks are streamed from the ensemble view in pages, in order of
+    finishing, and written in parts of at most `part_size` tasks. Exporting
+    again only appends the tasks that finished since: tasks are requested
+    from `overlap` seconds before the last exported finishing time, to
+    allow for clock differences between workers, and the tasks of that
+    period that were already exported are skipped. A part is only listed
+    in `export.json` once it has been written, so an interrupted export is
+    simply continued.
+
+    Arguments:
+        ensemble: the Ensemble, with the name and parameter specs
+        scoring: a function of a task that returns its score, like the
+            scoring function of a Simulator; it gets the picas Task of the
+            task document, which is fetched for each task. It is not
+            called for tasks in error, and scores that fail are NaN
+
+    Returns:
+        the number of exported tasks
+    '''
+    if scoring is not None:
+        from picas.documents import Task
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    state = _read_state(path)
+    columns = ExportColumns(ensemble.specs)
+    exported = 0
+
+    def flush():
+        part = 'part-{0:05d}.npz'.format(len(state['parts']))
+        part_path = os.path.join(path, part)
+        with open(part_path + '.tmp', 'wb') as f:
+            np.savez(f, **columns.arrays())
+        os.rename(part_path + '.tmp', part_path)
+        state['parts'].append(part)
+        # tasks that finished before the overlap are assumed to be exported
+        # and will not be requested again
+        state['complete_before'] = max(state['complete_before'],
+                                       state['latest'] - overlap)
+        state['recent'] = dict(
+            (task_id, time) for task_id, time in state['recent'].items()
+            if time >= state['complete_before'])
+        _write_state(path, state)
+        columns.clear()
+
+    for task in iter_tasks(task_db, name, version, url, ensemble.name,
+                           finished_since=state['complete_before'],
+                           page_size=page_size,
+                           prefetch=True):
+        if task['id'] in state['recent']:
+            continue
+        score = None
+        if scoring is not None and not task.get('error'):
+            try:
+                score = scoring(Task(task_db.db.get(task['id'])))
+            except Exception as ex:
+                print("Scoring task {0} failed: {1}".format(task['id'], ex))
+        columns.add(task, score)
+        time = finish_time(task)
+        state['recent'][task['id']] = time
+        state['latest'] = max(time, state['latest'])
+        exported += 1
+        if len(columns) >= part_size:
+            flush()
+
+    if len(columns) > 0:
+        flush()
+    return exported
+
+
+def load_export(path, columns=None):
+    '''
+    Load an export written by `export_ensemble`.
+
+    Arguments:
+        columns: names of the columns to load, by default all of them
+
+    Returns:
+        a dict of NumPy arrays by column name, which can be passed to
+        pandas.DataFrame
+    '''
+    values = {}
+    for part in _read_state(path)['parts']:
+        with np.load(os.path.join(path, part)) as data:
+            for name in (data.files if columns is None else columns):
+                values.setdefault(name, []).append(data[name])
+    return dict((name, np.concatenate(arrays))
+                for name, arrays in values.items())
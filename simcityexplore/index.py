@@ -0,0 +1,192 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+from .ensemble import iter_tasks, finish_time
+from numbers import Number
+import itertools
+import math
+
+
+class PointIndex(object):
+
+    """
+    Grid index of points, for nearest-neighbour and range queries.
+
+    Each point is stored in the grid cell that contains it, a cell being
+    `cell_sizes` wide in each dimension. Distances are Euclidean, measured
+    in cell sizes, so that dimensions with different units can be compared;
+    give the precision of each dimension as its cell size to measure in
+    steps of that precision. Adding a point takes constant time and a query
+    only visits the cells around the queried point, unless the grid has
+    fewer occupied cells, in which case those are visited.
+    """
+
+    def __init__(self, cell_sizes):
+        self.cell_sizes = list(cell_sizes)
+        self.ndim = len(self.cell_sizes)
+        self.cells = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _scaled(self, x):
+        return [v / s for v, s in zip(x, self.cell_sizes)]
+
+    def add(self, x, item=None):
+        ''' Add point x, with an item that is returned by queries. '''
+        if len(x) != self.ndim:
+            raise ValueError('Point %s does not have %d dimensions'
+                             % (str(x), self.ndim))
+        u = self._scaled(x)
+        cell = tuple(int(math.floor(v)) for v in u)
+        self.cells.setdefault(cell, []).append((u, list(x), item))
+        self.size += 1
+
+    def _distances(self, u, cells):
+        for cell in cells:
+            for v, x, item in self.cells.get(cell, ()):
+                distance = math.sqrt(sum((a - b) ** 2 for a, b in zip(u, v)))
+                yield distance, x, item
+
+    def _ring(self, center, radius):
+        ''' Cells at Chebyshev distance `radius` from the center cell. '''
+        ranges = [range(c - radius, c + radius + 1) for c in center]
+        for cell in itertools.product(*ranges):
+            if max(abs(a - c) for a, c in zip(cell, center)) == radius:
+                yield cell
+
+    def nearest(self, x, max_distance=None):
+        '''
+        Nearest point to x.
+
+        Returns:
+            a tuple of the distance, the point and its item, or None if no
+            point is within `max_distance`
+        '''
+        u = self._scaled(x)
+        center = [int(math.floor(v)) for v in u]
+        best = None
+        radius = 0
+        while len(self.cells) > 0:
+            if (2 * radius + 1) ** self.ndim > len(self.cells):
+                # visiting all occupied cells is cheaper
+                candidates = self._distances(u, list(self.cells))
+            else:
+                candidates = self._distances(u, self._ring(center, radius))
+            for candidate in candidates:
+                if best is None or candidate[0] < best[0]:
+                    best = candidate
+            if (2 * radius + 1) ** self.ndim > len(self.cells):
+                break
+            # points in the next ring are at least `radius` away
+            if best is not None and best[0] <= radius:
+                break
+            if max_distance is not None and radius > max_distance:
+                break
+            radius += 1
+
+        if best is None or (max_distance is not None and
+                            best[0] > max_distance):
+            return None
+        return best
+
+    def within(self, x, distance):
+        '''
+        Points within `distance` of x.
+
+        Returns:
+            a list of tuples of the distance, the point and its item, nearest
+            first
+        '''
+        u = self._scaled(x)
+        ranges = [range(int(math.floor(v - distance)),
+                        int(math.floor(v + distance)) + 1) for v in u]
+        ncells = 1
+        for r in ranges:
+            ncells *= len(r)
+        if ncells > len(self.cells):
+            cells = list(self.cells)
+        else:
+            cells = itertools.product(*ranges)
+        return sorted((found for found in self._distances(u, cells)
+                       if found[0] <= distance), key=lambda found: found[0])
+
+
+class TaskIndex(PointIndex):
+
+    """
+    Index of the input of the finished tasks of a command and version, as
+    submitted by a Simulator, in all its ensembles or in one of them.
+
+    The point of a task is its input values for `argnames` and its item the
+    view value of the task (see `simcityexplore.ensemble.iter_tasks`).
+    Tasks in error and tasks without a numeric value for each argument are
+    not indexed. `refresh` adds the tasks that finished since the last
+    refresh, in pages of `page_size`: like `export_ensemble`, it requests
+    tasks from `overlap` seconds before the last finishing time it has
+    seen and skips the tasks it already has.
+    """
+
+    def __init__(self, task_db, command, version, url, argnames, cell_sizes,
+                 ensemble=None, overlap=3600, page_size=1000):
+        super(TaskIndex, self).__init__(cell_sizes)
+        if len(argnames) != self.ndim:
+            raise ValueError('Give a cell size for each argument')
+        self.task_db = task_db
+        self.command = command
+        self.version = version
+        self.url = url
+        self.argnames = argnames
+        self.ensemble = ensemble
+        self.overlap = overlap
+        self.page_size = page_size
+        self.latest = 0
+        self.complete_before = 0
+        self.recent = {}
+
+    def refresh(self):
+        '''
+        Add the tasks that finished since the last refresh.
+
+        Returns:
+            the number of indexed tasks
+        '''
+        added = 0
+        for task in iter_tasks(self.task_db, self.command, self.version,
+                               self.url, self.ensemble,
+                               finished_since=self.complete_before,
+                               page_size=self.page_size, by='command'):
+            if task['id'] in self.recent:
+                continue
+            time = finish_time(task)
+            self.recent[task['id']] = time
+            self.latest = max(time, self.latest)
+            if task.get('error'):
+                continue
+            inputs = task.get('input') or {}
+            x = [inputs.get(name) for name in self.argnames]
+            if all(isinstance(v, Number) for v in x):
+                self.add(x, task)
+                added += 1
+
+        self.complete_before = max(self.complete_before,
+                                   self.latest - self.overlap)
+        self.recent = dict((task_id, time)
+                           for task_id, time in self.recent.items()
+                           if time >= self.complete_before)
+        return added
@@ -0,0 +1,135 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import uuid
+
+
+def input_key(kwargs):
+    ''' Hashable key of the input of a simulation. '''
+    return json.dumps(kwargs, sort_keys=True)
+
+
+def repair_last_line(path):
+    '''
+    Remove a truncated last line, from a crash during writing, from a
+    JSON-lines file, so that new lines are not appended to it.
+    '''
+    try:
+        with open(path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            end = size
+            while end > 0:
+                start = max(end - 4096, 0)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b'\n')
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end < size:
+                f.truncate(end)
+    except IOError:
+        pass
+
+
+class Journal(object):
+
+    """
+    Append-only journal of the simulations of a driver.
+
+    Each line is a JSON record of a point that was submitted, the task id
+    it got and its result. Records are written by the simulator and its
+    processes as soon as they happen, so that a driver that crashed can be
+    resumed (see `Simulator.resume`). With `sync`, each record is flushed to
+    disk before continuing.
+    """
+
+    def __init__(self, path, sync=True):
+        self.path = path
+        self.sync = sync
+        # process ids of a simulator are only unique within one session
+        self.session = uuid.uuid4().hex
+        self._repaired = False
+
+    def _write(self, record):
+        if not self._repaired:
+            repair_last_line(self.path)
+            self._repaired = True
+        record['session'] = self.session
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            if self.sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def submitted(self, pid, kwargs):
+        self._write({'event': 'submit', 'pid': pid, 'input': kwargs})
+
+    def task(self, pid, task_id):
+        self._write({'event': 'task', 'pid': pid, 'task_id': task_id})
+
+    def result(self, pid, value=None, error=None):
+        record = {'event': 'result', 'pid': pid}
+        if error is None:
+            record['value'] = value
+        else:
+            record['error'] = error
+        self._write(record)
+
+    def replay(self):
+        '''
+        Read the state of earlier sessions from the journal.
+
+        A truncated last line, from a crash during writing, is ignored.
+
+        Returns:
+            a tuple of a dict with the result of each finished input key
+            and a dict with the task id of each input key that was
+            submitted but did not finish. Inputs that failed are in
+            neither.
+        '''
+        points = {}
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    pid = (record['session'], record['pid'])
+                    if record['event'] == 'submit':
+                        points[pid] = {'key': input_key(record['input'])}
+                    elif pid in points:
+                        points[pid].update(record)
+        except IOError:
+            return {}, {}
+
+        results = {}
+        tasks = {}
+        for point in points.values():
+            if point.get('event') == 'result':
+                if 'error' not in point:
+                    results[point['key']] = point['value']
+            elif 'task_id' in point:
+                tasks[point['key']] = point['task_id']
+
+        for key in results:
+            tasks.pop(key, None)
+
+        return results, tasks
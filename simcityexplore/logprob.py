@@ -0,0 +1,147 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+from .parameter import IntervalSpec, ChoiceSpec, FixedSpec
+import numpy as np
+import numbers
+
+
+class SpecPrior(object):
+
+    """
+    Flat log-prior on the support of numeric parameter specs, evaluated
+    for many points at once.
+
+    A point is in the support if each value lies within the bounds of its
+    IntervalSpec, is one of the choices of its ChoiceSpec or equals the
+    value of its FixedSpec. The log-prior is 0 inside the support and -inf
+    outside. Called with a single point it returns a float, and with an
+    array of points, the last axis being the parameters, an array.
+    """
+
+    # log_prior calls it with all points at once
+    vectorized = True
+
+    def __init__(self, parameter_specs):
+        for spec in parameter_specs:
+            if isinstance(spec, ChoiceSpec):
+                values = spec.choices
+            elif isinstance(spec, FixedSpec):
+                values = [spec.value]
+            elif isinstance(spec, IntervalSpec):
+                values = []
+            else:
+                values = [None]
+            if not all(isinstance(v, numbers.Number) for v in values):
+                raise ValueError('Parameter {0} is not numeric'
+                                 .format(spec.name))
+        self.specs = parameter_specs
+        self.ndim = len(parameter_specs)
+
+    def in_support(self, x):
+        ''' Whether each point lies in the support. '''
+        x = np.asarray(x, dtype=float)
+        inside = np.ones(x.shape[:-1], dtype=bool)
+        for i, spec in enumerate(self.specs):
+            values = x[..., i]
+            if isinstance(spec, IntervalSpec):
+                if spec.min is not None:
+                    inside &= values >= spec.min
+                if spec.max is not None:
+                    inside &= values <= spec.max
+            elif isinstance(spec, ChoiceSpec):
+                inside &= np.isin(values, spec.choices)
+            else:
+                inside &= values == spec.value
+        return inside
+
+    def __call__(self, x):
+        lnprior = np.where(self.in_support(x), 0.0, -np.inf)
+        if lnprior.ndim == 0:
+            return float(lnprior)
+        return lnprior
+
+
+def log_prior(logp, points):
+    '''
+    Log-prior of each point of an (npoints, ndim) array, with one call if
+    `logp` is vectorized (see SpecPrior) and a call per point otherwise.
+    '''
+    points = np.asarray(points, dtype=float)
+    if getattr(logp, 'vectorized', False):
+        return np.asarray(logp(points), dtype=float).reshape(len(points))
+    return np.array([logp(x) for x in points], dtype=float)
+
+
+def lnlike_value(value):
+    ''' Log-likelihood of a simulator result; -inf if it failed. '''
+    if isinstance(value, Exception):
+        print("Simulation failed, rejecting point: {0}".format(value))
+        return -np.inf
+    return float(value)
+
+
+def start_batch(simulator, points, lnprior):
+    '''
+    Start simulations of the points with a finite log-prior. Points that
+    map to the same simulator input are simulated once.
+
+    Returns:
+        a dict of the indexes of the points of each started pid
+    '''
+    waiting = {}
+    started = {}
+    for i in np.flatnonzero(np.isfinite(lnprior)):
+        p = points[i]
+        key = simulator.key(p)
+        try:
+            waiting[started[key]].append(i)
+        except KeyError:
+            pid = simulator.start(list(p))
+            started[key] = pid
+            waiting[pid] = [i]
+    return waiting
+
+
+def log_probability(simulator, logp, points):
+    '''
+    Log-probability of a batch of points, with a Simulator whose score is
+    the log-likelihood. The log-prior of all points is computed first, and
+    only the points in its support are simulated, all started before any
+    is joined. Points that fail to simulate have a log-likelihood of -inf.
+
+    Arguments:
+        logp: log-prior function, for example a SpecPrior
+        points: array of points, the last axis being the parameters
+
+    Returns:
+        arrays of the log-probability, log-prior and log-likelihood of each
+        point
+    '''
+    points = np.asarray(points, dtype=float)
+    shape = points.shape[:-1]
+    points = points.reshape((-1, points.shape[-1]))
+    lnprior = log_prior(logp, points)
+    lnlike = np.full(len(points), -np.inf)
+    waiting = start_batch(simulator, points, lnprior)
+    while len(waiting) > 0:
+        pid, value = simulator.join()
+        lnlike[waiting.pop(pid)] = lnlike_value(value)
+    with np.errstate(invalid='ignore'):
+        lnprob = lnprior + lnlike
+    return (lnprob.reshape(shape), lnprior.reshape(shape),
+            lnlike.reshape(shape))
@@ -0,0 +1,283 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import deque
+import json
+import os
+
+# Lifecycle phases of a simulation task, in order, with the name of the
+# duration that ends in that phase. Timestamps of 'locked' and 'done' are
+# taken from the task itself, so they use the clock of the worker.
+PHASES = [
+    ('started', None),
+    ('process_started', 'process_startup'),
+    ('initialized', 'initialization'),
+    ('cache_checked', 'cache_lookup'),
+    ('submitted', 'submission'),
+    ('locked', 'queue_wait'),
+    ('done', 'run'),
+    ('observed', 'polling_lag'),
+    ('scoring_started', 'scoring_queue_wait'),
+    ('scored', 'scoring'),
+    ('joined', 'result_transfer'),
+]
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, 1800,
+                   3600, 7200, 14400, 28800, 86400)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _label_str(key, extra=()):
+    items = list(key) + list(extra)
+    if len(items) == 0:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(k, v) for k, v in items) + '}'
+
+
+class Counter(object):
+
+    """ Monotonically increasing count, optionally split by labels. """
+
+    def __init__(self, name, help=''):
+        self.name = name
+        self.help = help
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def prometheus_text(self):
+        lines = ['# HELP {0} {1}'.format(self.name, self.help),
+                 '# TYPE {0} counter'.format(self.name)]
+        for key in sorted(self._values):
+            lines.append('{0}{1} {2}'.format(self.name, _label_str(key),
+                                             self._values[key]))
+        return lines
+
+
+class Histogram(object):
+
+    """ Distribution of observed values in fixed buckets. """
+
+    def __init__(self, name, help='', buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        try:
+            state = self._values[key]
+        except KeyError:
+            state = {'buckets': [0] * (len(self.buckets) + 1),
+                     'sum': 0.0, 'count': 0}
+            self._values[key] = state
+
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        state['buckets'][i] += 1
+        state['sum'] += value
+        state['count'] += 1
+
+    def count(self, **labels):
+        try:
+            return self._values[_label_key(labels)]['count']
+        except KeyError:
+            return 0
+
+    def sum(self, **labels):
+        try:
+            return self._values[_label_key(labels)]['sum']
+        except KeyError:
+            return 0.0
+
+    def mean(self, **labels):
+        count = self.count(**labels)
+        if count == 0:
+            return float('nan')
+        return self.sum(**labels) / count
+
+    def quantile(self, q, **labels):
+        '''
+        Estimate a quantile by linear interpolation within its bucket.
+        Values in the last, unbounded, bucket are estimated as the largest
+        bucket boundary.
+        '''
+        try:
+            state = self._values[_label_key(labels)]
+        except KeyError:
+            return float('nan')
+
+        rank = q * state['count']
+        seen = 0
+        lower = 0.0
+        for i, upper in enumerate(self.buckets):
+            n = state['buckets'][i]
+            if n > 0 and seen + n >= rank:
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+            lower = upper
+        return self.buckets[-1]
+
+    def labels(self):
+        return [dict(key) for key in sorted(self._values)]
+
+    def prometheus_text(self):
+        lines = ['# HELP {0} {1}'.format(self.name, self.help),
+                 '# TYPE {0} histogram'.format(self.name)]
+        for key in sorted(self._values):
+            state = self._values[key]
+            cumulative = 0
+            for i, upper in enumerate(self.buckets):
+                cumulative += state['buckets'][i]
+                lines.append('{0}_bucket{1} {2}'.format(
+                    self.name, _label_str(key, [('le', upper)]), cumulative))
+            lines.append('{0}_bucket{1} {2}'.format(
+                self.name, _label_str(key, [('le', '+Inf')]), state['count']))
+            lines.append('{0}_sum{1} {2}'.format(
+                self.name, _label_str(key), state['sum']))
+            lines.append('{0}_count{1} {2}'.format(
+                self.name, _label_str(key), state['count']))
+        return lines
+
+
+class Metrics(object):
+
+    """
+    Lifecycle metrics of the tasks of a simulator.
+
+    Each task reports a timeline, a dict with its `pid`, `task_id`, whether
+    it was `cached`, `cancelled` or resulted in an `error`, and a `phases`
+    dict of timestamps (see PHASES). Durations between phases are kept in a
+    histogram; the most recent `max_timelines` timelines are kept in
+    memory and, if `timeline_path` is given, all timelines are appended
+    to that file as JSON lines.
+    """
+
+    def __init__(self, timeline_path=None, max_timelines=10000,
+                 buckets=DEFAULT_BUCKETS):
+        self.timeline_path = timeline_path
+        self.timelines = deque(maxlen=max_timelines)
+        self.tasks = Counter('simcityexplore_tasks_total',
+                             'Number of finished tasks by outcome.')
+        self.phases = Histogram('simcityexplore_task_phase_seconds',
+                                'Duration of task lifecycle phases.',
+                                buckets)
+        self.total = Histogram('simcityexplore_task_seconds',
+                               'Total duration of tasks.', buckets)
+
+    def record(self, timeline):
+        if timeline.get('cancelled'):
+            self.tasks.inc(outcome='cancelled')
+        elif timeline.get('error'):
+            self.tasks.inc(outcome='error')
+        elif timeline.get('cached'):
+            self.tasks.inc(outcome='cached')
+        else:
+            self.tasks.inc(outcome='simulated')
+
+        for phase, duration in durations(timeline['phases']):
+            self.phases.observe(duration, phase=phase)
+
+        phases = timeline['phases']
+        if 'started' in phases and 'joined' in phases:
+            self.total.observe(phases['joined'] - phases['started'])
+
+        self.timelines.append(timeline)
+        if self.timeline_path is not None:
+            with open(self.timeline_path, 'a') as f:
+                f.write(json.dumps(timeline) + '\n')
+
+    def summary(self):
+        ''' Mean, median and 95th percentile of each phase, as text. '''
+        lines = []
+        for phase in (name for _, name in PHASES if name is not None):
+            if self.phases.count(phase=phase) > 0:
+                lines.append(
+                    '{0:16s} n={1:<6d} mean={2:.3f}s p50={3:.3f}s '
+                    'p95={4:.3f}s'.format(
+                        phase, self.phases.count(phase=phase),
+                        self.phases.mean(phase=phase),
+                        self.phases.quantile(0.5, phase=phase),
+                        self.phases.quantile(0.95, phase=phase)))
+        return '\n'.join(lines)
+
+    def prometheus_text(self):
+        lines = (self.tasks.prometheus_text() +
+                 self.phases.prometheus_text() +
+                 self.total.prometheus_text())
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        ''' Write metrics in Prometheus text format, replacing atomically. '''
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.rename(tmp_path, path)
+
+    def write_timelines(self, path):
+        ''' Write the timelines kept in memory as JSON lines. '''
+        with open(path, 'w') as f:
+            for timeline in self.timelines:
+                f.write(json.dumps(timeline) + '\n')
+
+
+class RuntimeDistribution(object):
+
+    """ Sample of the most recent `max_samples` task runtimes. """
+
+    def __init__(self, max_samples=1000):
+        self._samples = deque(maxlen=max_samples)
+
+    def add(self, runtime):
+        self._samples.append(runtime)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def quantile(self, q):
+        if len(self._samples) == 0:
+            return float('nan')
+        samples = sorted(self._samples)
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+def durations(phases):
+    '''
+    Durations of the phases of a timeline, measured from the previous phase
+    that was recorded.
+
+    Returns:
+        a list of (duration name, seconds) tuples
+    '''
+    result = []
+    previous = None
+    for phase, name in PHASES:
+        if phase not in phases:
+            continue
+        if previous is not None:
+            result.append((name, max(phases[phase] - previous, 0.0)))
+        previous = phases[phase]
+    return result
@@ -0,0 +1,187 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function, division
+from .surrogate import GaussianProcess
+from .simulator import Simulator
+from .parameter import IntervalSpec
+from .sampler import BatchSampler
+from scipy.stats import norm
+import numpy as np
+import argparse
+import math
+
+
+def expected_improvement(mean, std, best):
+    ''' Expected improvement over `best` when maximizing. '''
+    std = np.maximum(std, 1e-12)
+    z = (mean - best) / std
+    return (mean - best) * norm.cdf(z) + std * norm.pdf(z)
+
+
+class BatchOptimizer(BatchSampler):
+
+    """
+    Asynchronous batch Bayesian optimization of the score of a Simulator.
+
+    The search space is the unit cube, mapped to simulator input by the
+    `choose` method of each parameter spec. After an initial latin
+    hypercube design of `initial_points` points, a Gaussian-process
+    surrogate (see `simcityexplore.surrogate`) is fit to the scores and new
+    points are chosen by expected improvement with local penalization
+    (Gonzalez et al., 2016). The expected improvement is reduced around
+    each point that is still being simulated, by the probability that the
+    point could improve the local maximum, given a Lipschitz constant
+    estimated from the surrogate. `batch_size` points, by default the
+    `max_jobs` of the simulator, are simulated at any time. As soon as one
+    result comes in, the surrogate is updated and the free slot is filled,
+    so the simulator never waits for a whole batch. Failed simulations are
+    not used to fit the surrogate.
+
+    Arguments:
+        simulator: a Simulator whose score is optimized
+        parameter_specs: specs with a `choose` method, one per argument
+        batch_size: number of points to simulate concurrently
+        surrogate: emulator with `add`, `predict` and `x`; by default a
+            GaussianProcess with a length scale of 0.2 of the unit cube
+        initial_points: size of the initial design, by default twice the
+            batch size and at least the number of dimensions plus one
+        candidates: number of random candidates to maximize the
+            acquisition function over
+        minimize: minimize the score instead of maximizing it
+        seed: seed of the random number generator
+    """
+
+    def __init__(self, simulator, parameter_specs, batch_size=None,
+                 surrogate=None, initial_points=None, candidates=1000,
+                 minimize=False, seed=None):
+        super(BatchOptimizer, self).__init__(
+            simulator, parameter_specs, batch_size, initial_points, seed)
+        if surrogate is None:
+            surrogate = GaussianProcess(length_scale=0.2, max_points=1000)
+        self.surrogate = surrogate
+        self.candidates = candidates
+        self.sign = -1 if minimize else 1
+        self.best_point = None
+        self.best_value = None
+
+    def _lipschitz(self, x):
+        ''' Largest gradient norm of the surrogate mean at points x. '''
+        h = 1e-4
+        mean = self.surrogate.predict(x)
+        grad = np.empty_like(x)
+        for i in range(self.ndim):
+            step = np.array(x)
+            step[:, i] += h
+            grad[:, i] = (self.surrogate.predict(step) - mean) / h
+        return max(np.max(np.sqrt(np.sum(grad ** 2, axis=1))), 1e-7)
+
+    def propose(self, n):
+        '''
+        Choose n points of the unit cube to simulate next, penalizing the
+        neighbourhood of the points that are being simulated.
+        '''
+        if len(self.surrogate) < 2:
+            return self.latin_hypercube(n)
+
+        best = np.max(self.surrogate.y)
+        x = self.random.rand(self.candidates, self.ndim)
+        # also search close to the best point so far
+        local = (self.surrogate.x[np.argmax(self.surrogate.y)] +
+                 0.05 * self.random.randn(self.candidates // 4, self.ndim))
+        x = np.vstack((x, np.clip(local, 0, 1 - 1e-9)))
+        mean, std = self.surrogate.predict(x, return_std=True)
+        acquisition = expected_improvement(mean, std, best)
+        lipschitz = self._lipschitz(x)
+
+        penalty = np.ones(len(x))
+
+        def penalize(busy):
+            bmean, bstd = self.surrogate.predict(busy, return_std=True)
+            for b, m, sd in zip(busy, bmean, np.maximum(bstd, 1e-12)):
+                distance = np.sqrt(np.sum((x - b) ** 2, axis=1))
+                penalty[:] *= norm.cdf((lipschitz * distance - best + m) / sd)
+
+        if len(self.pending) > 0:
+            penalize(np.array(list(self.pending.values())))
+        chosen = []
+        for _ in range(n):
+            u = x[np.argmax(acquisition * penalty)]
+            chosen.append(u)
+            penalize(u[np.newaxis, :])
+        return np.array(chosen)
+
+    def _finished(self, u, value):
+        if not isinstance(value, Exception):
+            self.surrogate.add(u, self.sign * value)
+            if (self.best_value is None or
+                    self.sign * value > self.sign * self.best_value):
+                self.best_point = self.point(u)
+                self.best_value = value
+
+    def run(self, evaluations):
+        '''
+        Run the optimization until `evaluations` simulations have finished.
+
+        Returns:
+            a generator yielding the simulator input and score of each
+            simulation as it finishes; scores of failed simulations are
+            exceptions. The best input and score so far are kept in
+            `best_point` and `best_value`.
+        '''
+        return super(BatchOptimizer, self).run(evaluations)
+
+
+def scoring(task):
+    import simcity
+    response_time = task.get_attachment(
+        'response_time.csv',
+        retrieve_from_database=simcity.get_task_database()
+    )['data']
+
+    return math.log(float(response_time))
+
+
+def main():
+    ''' Minimize the response time of the baseline model. '''
+    parser = argparse.ArgumentParser(description='Minimize the response time '
+                                     'with batch Bayesian optimization.')
+    parser.add_argument('--evaluations', type=int, default=50,
+                        help='number of simulations to run')
+    parser.add_argument('--seed', type=int, help='random seed')
+    args = parser.parse_args()
+
+    ensemble = "myfirstoptimizationensemble"
+    host = "lisa"
+    command = "~/baseline-model/optimallocations.py"
+    version = "0.1"
+
+    simulator = Simulator(ensemble, version, command, scoring, host,
+                          max_jobs=4, argnames=['x', 'y'],
+                          argprecisions=[0.01, 0.01], polling_time=3)
+    specs = [IntervalSpec('x', float, 0, 1), IntervalSpec('y', float, 0, 1)]
+    optimizer = BatchOptimizer(simulator, specs, minimize=True,
+                               seed=args.seed)
+    for p, value in optimizer.run(args.evaluations):
+        print("{0}: {1}".format(p, value))
+
+    print("best: {0}: {1}".format(optimizer.best_point,
+                                  optimizer.best_value))
+    print(simulator.metrics.summary())
+
+
+if __name__ == '__main__':
+    main()
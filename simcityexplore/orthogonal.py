@@ -15,13 +15,12 @@
 # limitations under the License.
 
 from __future__ import print_function
-import pyDOE
-from simulator import Simulator
-from parameter import IntervalSpec
+from .simulator import Simulator
+from .parameter import IntervalSpec
+from .journal import Journal
+import argparse
 import traceback
-import simcity
 import math
-import numpy as np
 
 
 def sample(parameter_specs, samples, seed=None):
@@ -34,6 +33,9 @@ def sample(parameter_specs, samples, seed=None):
         an enumerator with `samples` parameter settings, as a list of parameter
         values
     '''
+    import pyDOE
+    import numpy as np
+
     if seed is not None:
         np.random.seed(seed)
 
@@ -46,26 +48,50 @@ def sample(parameter_specs, samples, seed=None):
         ] for sample in lhd)
 
 
-if __name__ == '__main__':
+def scoring(task):
+    import simcity
+    response_time = task.get_attachment(
+        'response_time.csv',
+        retrieve_from_database=simcity.get_task_database()
+    )['data']
+
+    return math.log(float(response_time))
+
+
+def main():
+    ''' Explore the parameters of the baseline model. '''
+    parser = argparse.ArgumentParser(description='Explore parameters with '
+                                     'latin hypercube sampling.')
+    parser.add_argument('--journal',
+                        help='record submitted simulations in given journal')
+    parser.add_argument('--resume', action='store_true',
+                        help='resume from the journal after a crash')
+    parser.add_argument('--seed', type=int,
+                        help='random seed; required to resume, since the '
+                        'same points must be sampled again')
+    args = parser.parse_args()
+    if args.resume and (args.journal is None or args.seed is None):
+        parser.error('--resume requires --journal and --seed')
+
     ensemble = "myfirstorthogonalbaselineensemble"
     host = "lisa"
     command = "~/baseline-model/optimallocations.py"
     version = "0.1"
 
-    def scoring(task):
-        response_time = task.get_attachment(
-            'response_time.csv',
-            retrieve_from_database=simcity.get_task_database()
-        )['data']
-
-        return math.log(float(response_time))
+    if args.journal is None:
+        journal = None
+    else:
+        journal = Journal(args.journal)
 
     simulator = Simulator(ensemble, version, command, scoring, host,
                           max_jobs=2, argnames=['x', 'y'],
-                          argprecisions=[0.01, 0.01], polling_time=3)
+                          argprecisions=[0.01, 0.01], polling_time=3,
+                          journal=journal)
+    if args.resume:
+        simulator.resume()
 
     specs = [IntervalSpec('x', float, 0, 1), IntervalSpec('y', float, 0, 1)]
-    samples = list(sample(specs, 10))
+    samples = list(sample(specs, 10, seed=args.seed))
     results = {}
     print("Adding simulations", end="")
     for p in samples:
@@ -83,3 +109,8 @@ if __name__ == '__main__':
         results[str(samples[i - 1])] = value
 
     print(results)
+    print(simulator.metrics.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function, division
+from .logprob import log_prior, lnlike_value, start_batch
+import numpy as np
+
+
+def default_beta_ladder(ndim, ntemps):
+    '''
+    Geometric ladder of inverse temperatures, with the temperature step
+    that emcee uses for high-dimensional problems.
+    '''
+    tstep = 1 + 2 * np.sqrt(np.log(4)) / np.sqrt(ndim)
+    return tstep ** -np.arange(ntemps, dtype=float)
+
+
+class PTSampler(object):
+
+    """
+    Parallel-tempering ensemble sampler that evaluates the log-likelihood
+    with a Simulator.
+
+    The sampler follows the affine-invariant stretch move and temperature
+    swaps of emcee's PTSampler, with a similar interface. Instead of
+    evaluating walkers in a thread pool, all proposals of half a step are
+    started on the simulator at once. Each temperature continues with its
+    second half as soon as its own first half has been evaluated, so
+    temperatures overlap and simulations are always in flight. Points that
+    fail to simulate get a log-likelihood of -inf.
+
+    Given a `surrogate` (see `simcityexplore.surrogate`), the sampler uses
+    delayed acceptance: once the surrogate has `surrogate_min_points`
+    points, a proposal is first accepted or rejected on the log-likelihood
+    predicted by the surrogate, and only proposals that pass are simulated
+    and accepted with the ratio of true to predicted likelihood. While
+    `train_surrogate` is set, the surrogate is refit on the quantized point
+    of each simulation result, which makes the sampler adaptive. The
+    posterior is only sampled exactly with a fixed surrogate, so stop
+    training it after burn-in.
+
+    Arguments:
+        simulator: a Simulator whose score is the log-likelihood
+        logp: log-prior function of a single point, or of all points at
+            once if it is vectorized, like a SpecPrior
+        betas: inverse temperatures, by default `default_beta_ladder`
+        a: scale parameter of the stretch move
+        seed: seed of the random number generators of the sampler
+        surrogate: emulator of the log-likelihood with `add` and `predict`
+        surrogate_min_points: number of points to train on before screening
+        train_surrogate: whether to train the surrogate on new results
+    """
+
+    def __init__(self, ntemps, nwalkers, ndim, simulator, logp, betas=None,
+                 a=2.0, seed=None, surrogate=None, surrogate_min_points=20,
+                 train_surrogate=True):
+        if nwalkers % 2 != 0 or nwalkers < 2 * ndim:
+            raise ValueError("The number of walkers must be even and at "
+                             "least twice the number of dimensions")
+        if betas is None:
+            betas = default_beta_ladder(ndim, ntemps)
+
+        self.ntemps = ntemps
+        self.nwalkers = nwalkers
+        self.ndim = ndim
+        self.simulator = simulator
+        self.logp = logp
+        self.betas = np.array(betas, dtype=float)
+        self.a = a
+        self.random = np.random.RandomState(seed)
+        # each temperature draws from its own stream, so that a seeded run
+        # proposes the same points whatever order simulations finish in
+        self.temperature_random = [
+            np.random.RandomState(s)
+            for s in self.random.randint(2 ** 31 - 1, size=ntemps)]
+        self.surrogate = surrogate
+        self.surrogate_min_points = surrogate_min_points
+        self.train_surrogate = train_surrogate
+        self.reset()
+
+    def reset(self):
+        ''' Clear the chain and acceptance statistics. '''
+        self.nprop = np.zeros((self.ntemps, self.nwalkers))
+        self.nprop_accepted = np.zeros((self.ntemps, self.nwalkers))
+        self.nswap = np.zeros(self.ntemps)
+        self.nswap_accepted = np.zeros(self.ntemps)
+        self.nscreened = np.zeros(self.ntemps)
+        self.nsimulated = 0
+        self._chain = []
+        self._lnprob = []
+        self._lnlike = []
+
+    def evaluate(self, points):
+        '''
+        Evaluate the log-prior and log-likelihood of points. Points outside
+        the prior support are not simulated, and points that map to the same
+        simulator input are simulated once.
+
+        Returns:
+            arrays of the log-prior and log-likelihood of each point
+        '''
+        points = np.asarray(points)
+        lnprior = log_prior(self.logp, points)
+        lnlike = np.full(len(points), -np.inf)
+        waiting = self._start(points, lnprior)
+        while len(waiting) > 0:
+            pid, value = self.simulator.join()
+            idx = waiting.pop(pid)
+            lnlike[idx] = lnlike_value(value)
+            self._train(points[idx[0]], lnlike[idx[0]])
+        return lnprior, lnlike
+
+    def _start(self, points, lnprior):
+        ''' Start simulations; returns a dict of pid to point indexes. '''
+        waiting = start_batch(self.simulator, points, lnprior)
+        self.nsimulated += len(waiting)
+        return waiting
+
+    def _quantize(self, points):
+        return np.array([self.simulator.quantize(x) for x in points])
+
+    def _train(self, point, lnlike):
+        if self.surrogate is not None and self.train_surrogate:
+            self.surrogate.add(self.simulator.quantize(point), lnlike)
+
+    def _screen(self, p, lnprior, t, own, q, z, qlnprior):
+        '''
+        First stage of delayed acceptance, on the surrogate likelihood.
+
+        Returns:
+            the log-prior of the proposals, -inf for those that were
+            rejected, and the tempered difference between the surrogate
+            likelihood of the proposals and the current positions
+        '''
+        beta = self.betas[t]
+        sdiff = beta * (self.surrogate.predict(self._quantize(q)) -
+                        self.surrogate.predict(self._quantize(p[t, own])))
+        with np.errstate(invalid='ignore'):
+            lndiff = ((self.ndim - 1) * np.log(z) + qlnprior -
+                      lnprior[t, own] + sdiff)
+            passed = lndiff > np.log(
+                self.temperature_random[t].rand(len(own)))
+        self.nscreened[t] += np.sum(np.isfinite(qlnprior) & ~passed)
+        return np.where(passed, qlnprior, -np.inf), sdiff
+
+    def _propose(self, p, t, half):
+        ''' Stretch move proposals for one half of the walkers. '''
+        n = self.nwalkers // 2
+        own = np.arange(half * n, (half + 1) * n)
+        other = np.arange((1 - half) * n, (2 - half) * n)
+        random = self.temperature_random[t]
+        z = ((self.a - 1) * random.rand(n) + 1) ** 2 / self.a
+        partners = other[random.randint(n, size=n)]
+        q = p[t, partners] + z[:, np.newaxis] * (p[t, own] - p[t, partners])
+        return own, q, z
+
+    def _accept(self, p, lnprior, lnlike, lnprob, t, own, q, z, qlnprior,
+                qlnlike, sdiff=None):
+        beta = self.betas[t]
+        with np.errstate(invalid='ignore'):
+            qlnprob = qlnprior + beta * qlnlike
+            if sdiff is None:
+                lndiff = ((self.ndim - 1) * np.log(z) + qlnprob -
+                          lnprob[t, own])
+            else:
+                # second stage of delayed acceptance
+                lndiff = beta * (qlnlike - lnlike[t, own]) - sdiff
+                lndiff[~np.isfinite(qlnprior)] = -np.inf
+            accepted = lndiff > np.log(
+                self.temperature_random[t].rand(len(own)))
+        idx = own[accepted]
+        p[t, idx] = q[accepted]
+        lnprior[t, idx] = qlnprior[accepted]
+        lnlike[t, idx] = qlnlike[accepted]
+        lnprob[t, idx] = qlnprob[accepted]
+        self.nprop[t, own] += 1
+        self.nprop_accepted[t, idx] += 1
+
+    def _swap(self, p, lnprior, lnlike, lnprob):
+        for i in range(self.ntemps - 1, 0, -1):
+            dbeta = self.betas[i - 1] - self.betas[i]
+            iperm = self.random.permutation(self.nwalkers)
+            i1perm = self.random.permutation(self.nwalkers)
+            with np.errstate(invalid='ignore'):
+                paccept = dbeta * (lnlike[i, iperm] - lnlike[i - 1, i1perm])
+                asel = paccept > np.log(self.random.rand(self.nwalkers))
+            self.nswap[i] += self.nwalkers
+            self.nswap[i - 1] += self.nwalkers
+            self.nswap_accepted[i] += np.sum(asel)
+            self.nswap_accepted[i - 1] += np.sum(asel)
+
+            a = iperm[asel]
+            b = i1perm[asel]
+            for arr in (p, lnprior, lnlike):
+                tmp = arr[i, a].copy()
+                arr[i, a] = arr[i - 1, b]
+                arr[i - 1, b] = tmp
+        lnprob[:] = lnprior + self.betas[:, np.newaxis] * lnlike
+
+    def _step(self, p, lnprior, lnlike, lnprob):
+        # proposals of each (temperature, half) in flight, by pid
+        proposals = {}
+        waiting = {}
+        remaining = {}
+
+        def start(t, half):
+            own, q, z = self._propose(p, t, half)
+            qlnprior = log_prior(self.logp, q)
+            qlnlike = np.full(len(q), -np.inf)
+            sdiff = None
+            if (self.surrogate is not None and
+                    len(self.surrogate) >= self.surrogate_min_points):
+                qlnprior, sdiff = self._screen(p, lnprior, t, own, q, z,
+                                               qlnprior)
+            proposals[t] = (half, own, q, z, qlnprior, qlnlike, sdiff)
+            started = self._start(q, qlnprior)
+            remaining[t] = len(started)
+            for pid, idx in started.items():
+                waiting[pid] = (t, idx)
+            if remaining[t] == 0:
+                finish(t)
+
+        def finish(t):
+            half, own, q, z, qlnprior, qlnlike, sdiff = proposals.pop(t)
+            self._accept(p, lnprior, lnlike, lnprob, t, own, q, z,
+                         qlnprior, qlnlike, sdiff)
+            if half == 0:
+                start(t, 1)
+
+        for t in range(self.ntemps):
+            start(t, 0)
+
+        while len(waiting) > 0:
+            pid, value = self.simulator.join()
+            t, idx = waiting.pop(pid)
+            q, qlnlike = proposals[t][2], proposals[t][5]
+            qlnlike[idx] = lnlike_value(value)
+            self._train(q[idx[0]], qlnlike[idx[0]])
+            remaining[t] -= 1
+            if remaining[t] == 0:
+                finish(t)
+
+        self._swap(p, lnprior, lnlike, lnprob)
+
+    def sample(self, p0, lnprob0=None, lnlike0=None, iterations=1, thin=1,
+               store=None):
+        '''
+        Advance the chain `iterations` steps, storing every `thin`th step.
+        Given a `store` (see `simcityexplore.chainstore`), steps are
+        appended to it instead of kept in memory.
+
+        Returns:
+            a generator yielding the positions, log-probabilities and
+            log-likelihoods of all walkers after each step
+        '''
+        p = np.array(p0, dtype=float).reshape(
+            (self.ntemps, self.nwalkers, self.ndim))
+        lnprior = log_prior(self.logp, p.reshape((-1, self.ndim))).reshape(
+            (self.ntemps, self.nwalkers))
+        if lnlike0 is None:
+            _, lnlike = self.evaluate(p.reshape((-1, self.ndim)))
+            lnlike = lnlike.reshape((self.ntemps, self.nwalkers))
+        else:
+            lnlike = np.array(lnlike0, dtype=float)
+        if lnprob0 is None:
+            lnprob = lnprior + self.betas[:, np.newaxis] * lnlike
+        else:
+            lnprob = np.array(lnprob0, dtype=float)
+
+        for i in range(iterations):
+            self._step(p, lnprior, lnlike, lnprob)
+            if (i + 1) % thin == 0:
+                if store is None:
+                    self._chain.append(p.copy())
+                    self._lnprob.append(lnprob.copy())
+                    self._lnlike.append(lnlike.copy())
+                else:
+                    store.append(p, lnprob, lnlike,
+                                 self.acceptance_fraction)
+            yield p, lnprob, lnlike
+
+    @property
+    def chain(self):
+        ''' Stored positions, as (ntemps, nwalkers, nsteps, ndim). '''
+        if len(self._chain) == 0:
+            return np.empty((self.ntemps, self.nwalkers, 0, self.ndim))
+        return np.array(self._chain).transpose((1, 2, 0, 3))
+
+    @property
+    def flatchain(self):
+        ''' Stored positions, as (ntemps, nwalkers * nsteps, ndim). '''
+        return self.chain.reshape((self.ntemps, -1, self.ndim))
+
+    @property
+    def lnprobability(self):
+        if len(self._lnprob) == 0:
+            return np.empty((self.ntemps, self.nwalkers, 0))
+        return np.array(self._lnprob).transpose((1, 2, 0))
+
+    @property
+    def lnlikelihood(self):
+        if len(self._lnlike) == 0:
+            return np.empty((self.ntemps, self.nwalkers, 0))
+        return np.array(self._lnlike).transpose((1, 2, 0))
+
+    @property
+    def acceptance_fraction(self):
+        return self.nprop_accepted / np.maximum(self.nprop, 1)
+
+    @property
+    def tswap_acceptance_fraction(self):
+        return self.nswap_accepted / np.maximum(self.nswap, 1)
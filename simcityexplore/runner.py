@@ -0,0 +1,245 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+from .simulator import Simulator
+from .parameter import parse_parameter_spec
+from .journal import Journal, repair_last_line
+import importlib
+import argparse
+import json
+import os
+
+
+def sample_stream(parameter_specs, samples, seed=None, batch_size=1000):
+    '''
+    Sample from the parameter space using latin hypercube sampling, in
+    batches of `batch_size` points, so that the number of samples does not
+    affect memory use. Each batch is a latin hypercube of its own.
+
+    Returns:
+        a generator of `samples` parameter settings, as a list of parameter
+        values
+    '''
+    import numpy as np
+    from .sampler import latin_hypercube
+
+    random = np.random.RandomState(seed)
+    while samples > 0:
+        n = min(batch_size, samples)
+        for u in latin_hypercube(n, len(parameter_specs), random):
+            yield [spec.choose(x) for spec, x in zip(parameter_specs, u)]
+        samples -= n
+
+
+class ResultStore(object):
+
+    """
+    Append-only JSON-lines file of the results of a Runner.
+
+    Each line has the simulated `point`, the `key` of its input (see
+    `Simulator.key`) and its `value`, or the `error` of a failed
+    simulation. With `sync`, each result is flushed to disk before
+    continuing. A truncated last line, from a crash during writing, is
+    removed before the first new result is written.
+    """
+
+    def __init__(self, path, sync=False):
+        self.path = path
+        self.sync = sync
+        self.file = None
+
+    def write(self, point, key, value):
+        if self.file is None:
+            repair_last_line(self.path)
+            self.file = open(self.path, 'a')
+        record = {'point': point, 'key': key}
+        if isinstance(value, Exception):
+            record['error'] = str(value)
+        else:
+            record['value'] = value
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def keys(self):
+        '''
+        Keys of the points that were simulated successfully. A truncated
+        last line, from a crash during writing, is ignored.
+        '''
+        keys = set()
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if 'value' in record:
+                        keys.add(record['key'])
+        except IOError:
+            pass
+        return keys
+
+
+class Runner(object):
+
+    """
+    Streaming pipeline from a sampler, through a Simulator, to a store.
+
+    Points are taken from an iterator only when there is room: at most
+    `max_in_flight` simulations, by default the `max_jobs` of the
+    simulator, are running at any time, and each result is written to the
+    store as soon as it is joined. Memory use therefore does not depend on
+    the number of points. A point with the same input as a point that is
+    still running is not started again, but gets its result. Points whose
+    key is in `skip`, for example the keys of a store that is resumed, are
+    not simulated. Finished points are only simulated again if the
+    simulator is set to reuse results, with `memoize`, `use_cache` or an
+    `index`.
+    """
+
+    def __init__(self, simulator, store, max_in_flight=None, skip=None):
+        if max_in_flight is None:
+            max_in_flight = simulator.max_jobs
+        self.simulator = simulator
+        self.store = store
+        self.max_in_flight = max_in_flight
+        self.skip = skip or set()
+        self.running = {}
+        self.waiting = {}
+        self.started = 0
+        self.finished = 0
+        self.failed = 0
+
+    def run(self, points):
+        '''
+        Simulate all points and store their results.
+
+        Returns:
+            the number of results that were stored
+        '''
+        for p in points:
+            key = self.simulator.key(p)
+            if key in self.skip:
+                continue
+            if key in self.waiting:
+                self.waiting[key].append(p)
+                continue
+            while len(self.running) >= self.max_in_flight:
+                self._collect()
+            pid = self.simulator.start(p)
+            self.started += 1
+            self.running[pid] = key
+            self.waiting[key] = [p]
+
+        while len(self.running) > 0:
+            self._collect()
+        return self.finished
+
+    def _collect(self):
+        pid, value = self.simulator.join()
+        key = self.running.pop(pid)
+        for p in self.waiting.pop(key):
+            self.store.write(self.simulator.quantize(p), key, value)
+            self.finished += 1
+            if isinstance(value, Exception):
+                self.failed += 1
+
+
+def load_function(name):
+    ''' Function named by 'module:function'. '''
+    module, function = name.split(':')
+    return getattr(importlib.import_module(module), function)
+
+
+def main():
+    ''' Explore the parameters of a simulation given in a configuration. '''
+    parser = argparse.ArgumentParser(
+        description='Explore parameters with latin hypercube sampling, '
+        'storing the results as they come in.',
+        epilog='The configuration is a JSON object with the "ensemble", '
+        '"version", "command" and "host" of the simulation, its '
+        '"parameters" as a list of parameter specs, optionally their '
+        '"precisions", and a "scoring" function as "module:function". '
+        'Further optional keys are "max_jobs", "max_in_flight", '
+        '"polling_time", "use_cache", "scoring_processes", and "backend": '
+        '"simcity" (default) or "local", with "task_directory".')
+    parser.add_argument('config', help='JSON configuration file')
+    parser.add_argument('--samples', type=int, default=10,
+                        help='number of points to simulate')
+    parser.add_argument('--output', default='results.jsonl',
+                        help='file to append the results to')
+    parser.add_argument('--journal',
+                        help='record submitted simulations in given journal')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip the points that are in the output and '
+                        'continue from the journal after a crash')
+    parser.add_argument('--seed', type=int,
+                        help='random seed; required to resume, since the '
+                        'same points must be sampled again')
+    args = parser.parse_args()
+    if args.resume and args.seed is None:
+        parser.error('--resume requires --seed')
+
+    with open(args.config) as f:
+        config = json.load(f)
+    specs = [parse_parameter_spec(spec) for spec in config['parameters']]
+    names = [spec.name for spec in specs]
+    precisions = config.get('precisions', {})
+
+    if config.get('backend', 'simcity') == 'local':
+        from .backend import LocalBackend
+        backend = LocalBackend(config.get('task_directory'))
+    else:
+        backend = None
+
+    journal = None if args.journal is None else Journal(args.journal)
+    max_jobs = config.get('max_jobs', 4)
+    simulator = Simulator(
+        config['ensemble'], config['version'], config['command'],
+        load_function(config['scoring']), config['host'], max_jobs=max_jobs,
+        polling_time=config.get('polling_time', 60), argnames=names,
+        argprecisions=[precisions.get(name) for name in names],
+        use_cache=config.get('use_cache', False), backend=backend,
+        journal=journal, scoring_processes=config.get('scoring_processes'))
+
+    store = ResultStore(args.output)
+    skip = None
+    if args.resume:
+        skip = store.keys()
+        if journal is not None:
+            simulator.resume()
+
+    runner = Runner(simulator, store, config.get('max_in_flight'), skip)
+    try:
+        runner.run(sample_stream(specs, args.samples, args.seed))
+    finally:
+        store.close()
+        simulator.close()
+    print("stored {0} results in {1}, {2} failed".format(
+        runner.finished, args.output, runner.failed))
+    print(simulator.metrics.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+import numpy as np
+
+
+def latin_hypercube(n, ndim, random=np.random):
+    '''
+    Latin hypercube design of n points in the unit cube, drawn with the
+    given numpy RandomState.
+
+    Returns:
+        an (n, ndim) array
+    '''
+    strata = np.array([random.permutation(n) for _ in range(ndim)]).T
+    return (strata + random.rand(n, ndim)) / n
+
+
+class BatchSampler(object):
+
+    """
+    Sequential design of simulations of the unit cube, mapped to simulator
+    input by the `choose` method of each parameter spec.
+
+    After an initial latin hypercube design of `initial_points` points, new
+    points are chosen with `propose`. `batch_size` points, by default the
+    `max_jobs` of the simulator, are simulated at any time: as soon as one
+    result comes in it is passed to `_finished` and the free slot is
+    filled, so the simulator never waits for a whole batch. Subclasses
+    implement `propose` and `_finished`.
+
+    Arguments:
+        simulator: a Simulator whose score is sampled
+        parameter_specs: specs with a `choose` method, one per argument
+        batch_size: number of points to simulate concurrently
+        initial_points: size of the initial design, by default twice the
+            batch size and at least the number of dimensions plus one
+        seed: seed of the random number generator
+    """
+
+    def __init__(self, simulator, parameter_specs, batch_size=None,
+                 initial_points=None, seed=None):
+        if batch_size is None:
+            batch_size = simulator.max_jobs
+        self.ndim = len(parameter_specs)
+        if initial_points is None:
+            initial_points = max(2 * batch_size, self.ndim + 1)
+        self.simulator = simulator
+        self.specs = parameter_specs
+        self.batch_size = batch_size
+        self.initial_points = initial_points
+        self.random = np.random.RandomState(seed)
+        self.pending = {}
+
+    def point(self, u):
+        ''' Simulator input of point u of the unit cube. '''
+        return [spec.choose(x) for spec, x in zip(self.specs, u)]
+
+    def latin_hypercube(self, n):
+        ''' Latin hypercube design of n points in the unit cube. '''
+        return latin_hypercube(n, self.ndim, self.random)
+
+    def propose(self, n):
+        ''' Choose n points of the unit cube to simulate next. '''
+        raise NotImplementedError
+
+    def _finished(self, u, value):
+        ''' Use the score of point u, an exception if it failed. '''
+        raise NotImplementedError
+
+    def _start(self, u):
+        pid = self.simulator.start(self.point(u))
+        self.pending[pid] = u
+
+    def run(self, evaluations):
+        '''
+        Run until `evaluations` simulations have finished.
+
+        Returns:
+            a generator yielding the simulator input and score of each
+            simulation as it finishes; scores of failed simulations are
+            exceptions
+        '''
+        initial = list(self.latin_hypercube(
+            min(self.initial_points, evaluations)))
+        started = 0
+        finished = 0
+        while finished < evaluations:
+            free = min(self.batch_size - len(self.pending),
+                       evaluations - started)
+            started += max(free, 0)
+            while free > 0 and len(initial) > 0:
+                self._start(initial.pop(0))
+                free -= 1
+            if free > 0:
+                for u in self.propose(free):
+                    self._start(u)
+
+            pid, value = self.simulator.join()
+            u = self.pending.pop(pid)
+            finished += 1
+            self._finished(u, value)
+            yield self.point(u), value
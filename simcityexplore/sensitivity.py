@@ -0,0 +1,146 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+from .runner import Runner
+import numpy as np
+
+
+def saltelli_design(ndim, samples, seed=None):
+    '''
+    Saltelli design of the unit cube: two independent random matrices A and
+    B of `samples` points, and for each dimension i the matrix A with
+    column i taken from B.
+
+    Returns:
+        A and B as (samples, ndim) arrays and the mixed matrices as a
+        (ndim, samples, ndim) array
+    '''
+    random = np.random.RandomState(seed)
+    a = random.rand(samples, ndim)
+    b = random.rand(samples, ndim)
+    ab = np.repeat(a[np.newaxis], ndim, axis=0)
+    dims = np.arange(ndim)
+    ab[dims, :, dims] = b.T
+    return a, b, ab
+
+
+def _indices(f_a, f_b, f_ab):
+    '''
+    First-order and total indices, estimated over the last axis; f_ab has
+    the dimensions as an extra first axis.
+    '''
+    variance = np.var(np.concatenate((f_a, f_b), axis=-1), axis=-1)
+    # Saltelli et al. (2010) and Jansen (1999)
+    first = np.mean(f_b * (f_ab - f_a), axis=-1) / variance
+    total = 0.5 * np.mean((f_a - f_ab) ** 2, axis=-1) / variance
+    return first, total
+
+
+def sobol_indices(f_a, f_b, f_ab, bootstrap=1000, confidence=0.95,
+                  seed=None, max_values=10 ** 7):
+    '''
+    Sobol indices from the values of a function at a Saltelli design (see
+    saltelli_design). Points where any of the values is NaN are left out.
+    Confidence intervals are computed from `bootstrap` resamples of the
+    points, estimated in chunks of at most about `max_values` values.
+    Raises ValueError if fewer than two points are left or the values do
+    not vary, since the indices are then undefined.
+
+    Arguments:
+        f_a, f_b: values at the points of A and B, as (samples,) arrays
+        f_ab: values at the mixed matrices, as a (ndim, samples) array
+
+    Returns:
+        a dict with the 'first_order' and 'total' index of each dimension
+        and their confidence intervals 'first_order_interval' and
+        'total_interval', as (2, ndim) arrays of the lower and upper bound
+    '''
+    f_a = np.asarray(f_a, dtype=float)
+    f_b = np.asarray(f_b, dtype=float)
+    f_ab = np.asarray(f_ab, dtype=float)
+    valid = ~(np.isnan(f_a) | np.isnan(f_b) | np.any(np.isnan(f_ab), axis=0))
+    f_a, f_b, f_ab = f_a[valid], f_b[valid], f_ab[:, valid]
+    if len(f_a) < 2:
+        raise ValueError('no valid evaluations')
+    if np.var(np.concatenate((f_a, f_b))) == 0:
+        raise ValueError('the function is constant at the valid evaluations')
+
+    first, total = _indices(f_a, f_b, f_ab)
+    result = {'first_order': first, 'total': total}
+    if bootstrap > 0:
+        random = np.random.RandomState(seed)
+        n = len(f_a)
+        # limit the resampled values in memory to about `max_values`
+        chunk = max(max_values // (n * (len(f_ab) + 2)), 1)
+        estimates = []
+        for start in range(0, bootstrap, chunk):
+            resample = random.randint(n, size=(min(chunk, bootstrap - start),
+                                               n))
+            estimates.append(_indices(f_a[resample], f_b[resample],
+                                      f_ab[:, resample]))
+        # (ndim, bootstrap) estimates
+        first = np.concatenate([e[0] for e in estimates], axis=1)
+        total = np.concatenate([e[1] for e in estimates], axis=1)
+        tail = 50 * (1 - confidence)
+        for name, estimates in (('first_order', first), ('total', total)):
+            result[name + '_interval'] = np.percentile(
+                estimates, [tail, 100 - tail], axis=1)
+    return result
+
+
+class _Values(object):
+
+    """ Result store of a Runner that keeps values by input key. """
+
+    def __init__(self):
+        self.values = {}
+
+    def write(self, point, key, value):
+        self.values[key] = value
+
+
+def sensitivity_analysis(simulator, parameter_specs, samples,
+                         bootstrap=1000, confidence=0.95, seed=None,
+                         max_in_flight=None):
+    '''
+    Global sensitivity analysis of the score of a simulator, with Sobol
+    indices estimated from a Saltelli design of `samples` base points,
+    that is (ndim + 2) * samples simulations.
+
+    Points are simulated through a Runner (see `simcityexplore.runner`),
+    so a point with the same input as a running point is not simulated
+    again; with a simulator that memoizes or has an index, finished
+    results are reused as well. Failed simulations are left out of the
+    estimates; if all of them failed, ValueError is raised.
+
+    Returns:
+        the Sobol indices and their confidence intervals, see sobol_indices
+    '''
+    ndim = len(parameter_specs)
+    a, b, ab = saltelli_design(ndim, samples, seed)
+    units = np.concatenate((a, b, ab.reshape(-1, ndim)))
+    points = [[spec.choose(x) for spec, x in zip(parameter_specs, u)]
+              for u in units]
+
+    values = _Values()
+    Runner(simulator, values, max_in_flight).run(points)
+
+    f = [values.values[simulator.key(p)] for p in points]
+    f = np.array([np.nan if isinstance(v, Exception) else v for v in f])
+    return sobol_indices(f[:samples], f[samples:2 * samples],
+                         f[2 * samples:].reshape(ndim, samples),
+                         bootstrap, confidence, seed)
@@ -1,4 +1,3 @@
-#!/usr/bin/env python
 # SIM-CITY explore
 #
 # Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
@@ -16,26 +15,9 @@
 # limitations under the License.
 
 from __future__ import print_function
-import numpy as np
-import emcee
-import simcity
+import argparse
 import math
-import matplotlib.pyplot as pl
-from simulator import Simulator
-
-ensemble = "myfirstbaselineensemble"
-host = "lisa"
-command = "~/baseline-model/optimallocations.py"
-version = "0.1"
-
-# Use a uniform random sample in [0, 1]^2
-
-
-def flat_prior(x):
-    if x[0] >= 0 and x[0] <= 1 and x[1] >= 0 and x[1] <= 1:
-        return 0.0
-    else:
-        return float('-inf')
+import os
 
 # def scoring(task):
 #     geojson_str = task.get_attachment('GeoFirePaths.json',
@@ -49,6 +31,7 @@ def flat_prior(x):
 
 
 def scoring(task):
+    import simcity
     response_time = task.get_attachment(
         'response_time.csv',
         retrieve_from_database=simcity.get_task_database()
@@ -57,57 +40,196 @@ def scoring(task):
     return math.log(float(response_time))
 
 
-simulator = Simulator(ensemble, version, command, scoring, host, max_jobs=1,
-                      argnames=['x', 'y'], argprecisions=[0.01, 0.01],
-                      polling_time=3)
-#
-# ndim = 1
-# means = np.random.rand(ndim)
-#
-# print("constructing covariance matrix")
-# cov = 0.5 - np.random.rand(ndim ** 2).reshape((ndim, ndim))
-# cov = np.triu(cov)
-# cov += cov.T - np.diag(cov.diagonal())
-# cov = np.dot(cov, cov)
-#
-# icov = np.linalg.inv(cov)
-
-ntemps = 10
-nwalkers = 4
-ndim = 2
-p0 = np.random.rand(ntemps, nwalkers, ndim)
-
-# sampler
-print("constructing walkers")
-# nwalkers = 250
-# p0 = np.random.rand(ndim * nwalkers).reshape((nwalkers, ndim))
-
-# sampler = emcee.EnsembleSampler(
-#     nwalkers, ndim, run_task, args=[means, icov], threads=15)
-
-sampler = emcee.PTSampler(ntemps, nwalkers, ndim, simulator, flat_prior,
-                          threads=8)
-
-print("burning in mcmc")
-for p, lnprob, lnlike in sampler.sample(p0, iterations=10):
-    pass
-sampler.reset()
-
-print("running mcmc")
-for p, lnprob, lnlike in sampler.sample(p, lnprob0=lnprob,
-                                        lnlike0=lnlike,
-                                        iterations=100, thin=10):
-    pass
-
-print(sampler.flatchain)
-
-for walker in sampler.flatchain:
-    for i in range(ndim):
-        pl.figure()
-        pl.hist(walker[:, i], 100, color="k", histtype="step")
-        pl.title("Dimension {0:d}".format(i))
-
-pl.show()
-
-print("Mean acceptance fraction: {0:.3f}"
-      .format(np.mean(sampler.acceptance_fraction)))
+def main():
+    ''' Sample the parameters of the baseline model. '''
+    import numpy as np
+    import matplotlib.pyplot as pl
+    from .simulator import Simulator
+    from .ptsampler import PTSampler
+    from .logprob import SpecPrior
+    from .parameter import IntervalSpec
+    from .surrogate import GaussianProcess
+    from .journal import Journal
+    from .chainstore import ChainStore
+    from .checkpoint import save_checkpoint, load_checkpoint
+    from .convergence import ConvergenceMonitor
+
+    parser = argparse.ArgumentParser(description='Sample parameters with '
+                                     'parallel-tempering MCMC.')
+    parser.add_argument('--delayed-acceptance', action='store_true',
+                        help='screen proposals with a Gaussian-process '
+                        'surrogate before simulating them')
+    parser.add_argument('--chain', default='simemcee-chain',
+                        help='directory to store the chain in')
+    parser.add_argument('--checkpoint', default='simemcee.checkpoint',
+                        help='file to save the sampler state to after each '
+                        'stored step')
+    parser.add_argument('--max-rhat', type=float, default=1.1,
+                        help='end burn-in once the Gelman-Rubin R-hat of a '
+                        'burn-in window is below this value')
+    parser.add_argument('--burn-in-window', type=int, default=10,
+                        help='number of iterations to compute R-hat over')
+    parser.add_argument('--max-burn-in', type=int, default=100,
+                        help='maximum number of burn-in iterations')
+    parser.add_argument('--min-ess', type=float, default=400,
+                        help='stop once the cold chain has this effective '
+                        'sample size, and')
+    parser.add_argument('--tau-factor', type=float, default=50,
+                        help='is at least this many autocorrelation times '
+                        'long')
+    parser.add_argument('--max-iterations', type=int, default=1000,
+                        help='maximum number of production iterations')
+    parser.add_argument('--journal',
+                        help='record submitted simulations in given journal')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue from the checkpoint and journal after '
+                        'a crash')
+    parser.add_argument('--seed', type=int,
+                        help='random seed; required to resume without a '
+                        'checkpoint, since the same points must be proposed '
+                        'again')
+    args = parser.parse_args()
+    resume_checkpoint = args.resume and os.path.exists(args.checkpoint)
+    if args.resume and not resume_checkpoint and (args.journal is None or
+                                                  args.seed is None):
+        parser.error('--resume requires a checkpoint, or --journal and --seed')
+
+    ensemble = "myfirstbaselineensemble"
+    host = "lisa"
+    command = "~/baseline-model/optimallocations.py"
+    version = "0.1"
+
+    if args.journal is None:
+        journal = None
+    else:
+        journal = Journal(args.journal)
+
+    simulator = Simulator(ensemble, version, command, scoring, host,
+                          max_jobs=8, argnames=['x', 'y'],
+                          argprecisions=[0.01, 0.01], polling_time=3,
+                          memoize=True, journal=journal)
+    # proposals that were simulated before the crash are not simulated again
+    if args.resume:
+        simulator.resume()
+    #
+    # ndim = 1
+    # means = np.random.rand(ndim)
+    #
+    # print("constructing covariance matrix")
+    # cov = 0.5 - np.random.rand(ndim ** 2).reshape((ndim, ndim))
+    # cov = np.triu(cov)
+    # cov += cov.T - np.diag(cov.diagonal())
+    # cov = np.dot(cov, cov)
+    #
+    # icov = np.linalg.inv(cov)
+
+    ntemps = 10
+    nwalkers = 4
+    ndim = 2
+    p0 = np.random.RandomState(args.seed).rand(ntemps, nwalkers, ndim)
+
+    # sampler
+    print("constructing walkers")
+    # nwalkers = 250
+    # p0 = np.random.rand(ndim * nwalkers).reshape((nwalkers, ndim))
+
+    # sampler = emcee.EnsembleSampler(
+    #     nwalkers, ndim, run_task, args=[means, icov], threads=15)
+
+    if args.delayed_acceptance:
+        surrogate = GaussianProcess(length_scale=0.1)
+    else:
+        surrogate = None
+
+    # uniform prior on [0, 1]^2, evaluated for all walkers at once
+    prior = SpecPrior([IntervalSpec('x', float, 0, 1),
+                       IntervalSpec('y', float, 0, 1)])
+    # all walkers of all temperatures are simulated concurrently
+    sampler = PTSampler(ntemps, nwalkers, ndim, simulator, prior,
+                        seed=args.seed, surrogate=surrogate)
+
+    thin = 10
+    store = ChainStore(args.chain, ntemps, nwalkers, ndim)
+    # diagnostics of the cold chain
+    monitor = ConvergenceMonitor(nwalkers, ndim)
+
+    if resume_checkpoint:
+        p, lnprob, lnlike, state = load_checkpoint(args.checkpoint, sampler)
+        # steps stored after the checkpoint are sampled again
+        store.truncate(state['nsteps'])
+        print("resuming {0} at iteration {1}".format(state['phase'],
+                                                     state['iteration']))
+    else:
+        p, lnprob, lnlike = p0, None, None
+        state = {'phase': 'burn-in', 'iteration': 0}
+
+    if state['phase'] == 'burn-in':
+        print("burning in mcmc")
+        # R-hat is computed over consecutive windows, so that the start of
+        # burn-in does not count; a window that was interrupted starts over
+        for i, (p, lnprob, lnlike) in enumerate(
+                sampler.sample(
+                    p, lnprob0=lnprob, lnlike0=lnlike,
+                    iterations=args.max_burn_in - state['iteration']),
+                state['iteration'] + 1):
+            save_checkpoint(args.checkpoint, sampler, p, lnprob, lnlike,
+                            phase='burn-in', iteration=i, nsteps=0)
+            monitor.add(p[0])
+            if len(monitor) == args.burn_in_window:
+                rhat = monitor.gelman_rubin()
+                print("burn-in iteration {0}: R-hat {1}".format(i, rhat))
+                if monitor.converged(max_rhat=args.max_rhat):
+                    break
+                monitor = ConvergenceMonitor(nwalkers, ndim)
+        monitor = ConvergenceMonitor(nwalkers, ndim)
+        sampler.reset()
+        # a fixed surrogate keeps delayed acceptance exact
+        sampler.train_surrogate = False
+        store.clear()
+        state = {'phase': 'production', 'iteration': 0}
+        save_checkpoint(args.checkpoint, sampler, p, lnprob, lnlike,
+                        nsteps=0, **state)
+    else:
+        for step in range(len(store)):
+            monitor.add(store.chain[0, :, step])
+
+    print("running mcmc")
+    for i, (p, lnprob, lnlike) in enumerate(
+            sampler.sample(
+                p, lnprob0=lnprob, lnlike0=lnlike,
+                iterations=args.max_iterations - state['iteration'],
+                thin=thin, store=store),
+            state['iteration'] + 1):
+        if i % thin == 0:
+            save_checkpoint(args.checkpoint, sampler, p, lnprob, lnlike,
+                            phase='production', iteration=i, nsteps=len(store))
+            # autocorrelation times are in stored steps
+            monitor.add(p[0])
+            if monitor.converged(min_ess=args.min_ess,
+                                 tau_factor=args.tau_factor):
+                print("converged after {0} iterations".format(i))
+                break
+
+    print("autocorrelation time: {0}, effective sample size: {1}".format(
+        monitor.autocorrelation_time() * thin,
+        monitor.effective_sample_size()))
+
+    print("stored {0} steps in {1}".format(len(store), args.chain))
+
+    for t in range(ntemps):
+        for i in range(ndim):
+            pl.figure()
+            pl.hist(store.samples(t, i), 100, color="k", histtype="step")
+            pl.title("Dimension {0:d}".format(i))
+
+    pl.show()
+
+    print("Mean acceptance fraction: {0:.3f}"
+          .format(np.mean(sampler.acceptance_fraction)))
+    if surrogate is not None:
+        print("Simulated {0} proposals, screened out {1:.0f}"
+              .format(sampler.nsimulated, np.sum(sampler.nscreened)))
+
+
+if __name__ == '__main__':
+    main()
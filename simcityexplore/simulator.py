@@ -15,22 +15,65 @@
 # limitations under the License.
 
 
-import simcity
-from picas.documents import Task
-from numbers import Number
+from .backend import SimCityBackend, TaskCancelled
+from .metrics import Metrics, RuntimeDistribution
+from .journal import input_key
+from collections import deque
 import multiprocessing as mp
 import traceback
+import time
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
 
 
 class Simulator(object):
 
     """
     SIM-CITY simulator
+
+    Tasks are executed by given backend, by default on the SIM-CITY
+    infrastructure (see `simcityexplore.backend`). The lifecycle of each
+    task started with `start` is recorded in `metrics` (see
+    `simcityexplore.metrics`).
+
+    With `speculative` set, a task that runs longer than `speculative_factor`
+    times the `speculative_quantile` of earlier runtimes is started a second
+    time, on the next of `speculative_hosts` if given. The first copy to
+    succeed provides the result and the other copy is cancelled.
+
+    Given a `journal` (see `simcityexplore.journal`), started points, their
+    task ids and results are recorded. After a crash, `resume` reads the
+    journal so that points that finished are not simulated again and points
+    that were still running are reattached to their task. With `memoize`,
+    results are also kept in memory, so a point is simulated only once.
+
+    Given an `index` of finished tasks (see `simcityexplore.index`), a point
+    is not simulated if a task of the same command and version within
+    `reuse_distance` of its quantized values was indexed; the nearest such
+    task is scored instead. Refresh the index before starting points to
+    include recently finished tasks.
+
+    By default a task is scored in the process that waited for it. With
+    `scoring_processes`, finished tasks are passed through a queue to a
+    pool of that many scoring processes instead, so that slow scoring does
+    not hold up waiting for other tasks. Call `close` to stop the pool.
     """
 
     def __init__(self, ensemble, version, command, scoring, host, max_jobs=4,
                  polling_time=60, argnames=None, argprecisions=None,
-                 couchdb=None, use_cache=False):
+                 couchdb=None, use_cache=False, backend=None, metrics=None,
+                 speculative=False, speculative_quantile=0.9,
+                 speculative_factor=1.5, speculative_min_samples=10,
+                 speculative_hosts=None, journal=None, memoize=False,
+                 index=None, reuse_distance=0, scoring_processes=None):
+        if backend is None:
+            backend = SimCityBackend()
+        if metrics is None:
+            metrics = Metrics()
+        self.backend = backend
+        self.metrics = metrics
         self.couchdb = couchdb
         self.ensemble = ensemble
         self.version = version
@@ -46,6 +89,30 @@ class Simulator(object):
         self.current_pid = 0
         self.proc_q = mp.Queue()
         self.proc = {}
+        self.started = {}
+        self.points = {}
+        self.cancelled = {}
+        self.results = deque()
+        self.speculative = speculative
+        self.speculative_quantile = speculative_quantile
+        self.speculative_factor = speculative_factor
+        self.speculative_min_samples = speculative_min_samples
+        self.speculative_hosts = speculative_hosts or []
+        self.runtimes = RuntimeDistribution()
+        self.twins = {}
+        self.primary = {}
+        self.speculated = set()
+        self.discarded = set()
+        self.journal = journal
+        self.memoize = memoize
+        self.evaluated = {}
+        self.keys = {}
+        self.resumed_tasks = {}
+        self.index = index
+        self.reuse_distance = reuse_distance
+        self.scoring_processes = scoring_processes
+        self.score_q = None
+        self.scorers = []
 
     def _keyval(self, p, i):
         try:
@@ -60,72 +127,307 @@ class Simulator(object):
 
         return (key, value)
 
-    def __call__(self, p, host=None):
+    def _input(self, p):
+        return dict(self._keyval(p, i) for i in range(len(p)))
+
+    def quantize(self, p):
+        """ Values of point p as they are simulated. """
+        return [self._keyval(p, i)[1] for i in range(len(p))]
+
+    def key(self, p):
+        """ Key of the simulator input of point p; equal after quantizing. """
+        return input_key(self._input(p))
+
+    def resume(self):
+        """
+        Resume from the journal: reuse the results of points that finished
+        and reattach to the tasks of points that did not.
+        """
+        results, tasks = self.journal.replay()
+        self.evaluated.update(results)
+        self.resumed_tasks.update(tasks)
+
+    def __call__(self, p, host=None, timeline=None, cancelled=None,
+                 task_id=None):
+        if timeline is None:
+            timeline = {'phases': {}}
+        task = self.run(p, host, timeline, cancelled, task_id)
+        return self.score(task, timeline)
+
+    def run(self, p, host=None, timeline=None, cancelled=None, task_id=None):
+        """
+        Run point p, or reattach to its task, and return the finished task.
+        Raises TaskCancelled if it was cancelled and EnvironmentError if it
+        failed.
+        """
         if host is None:
             host = self.default_host
+        if timeline is None:
+            timeline = {'phases': {}}
+        phases = timeline['phases']
 
-        kwargs = dict(self._keyval(p, i) for i in range(len(p)))
+        kwargs = self._input(p)
 
         task = None
 
-        if self.use_cache:
-            js_input = ""
-            for key in kwargs:
-                if isinstance(kwargs[key], Number):
-                    js_input += "&& doc.input['%s'] == %f" % (key, kwargs[key])
-                else:
-                    js_input += "&& doc.input['%s'] == '%s'" % (
-                        key, str(kwargs[key]))
-
-            map_fun = '''function(doc) {
-                if (doc.type == 'task' && doc.done > 0 &&
-                    doc.command == '%s' && doc.version == '%s' %s) {
-                    emit(doc._id, doc)
-                }
-            }''' % (self.command, self.version, js_input)
-            for row in simcity.get_task_database().db.query(map_fun, limit=1):
-                task = Task(row.value)
-                print("using cache")
+        if task_id is not None:
+            task = self.backend.get_task(task_id)
+            timeline['task_id'] = task_id
+        else:
+            if self.index is not None:
+                for _, _, found in self.index.within(self.quantize(p),
+                                                     self.reuse_distance):
+                    if (found.get('command') == self.command and
+                            found.get('version') == self.version):
+                        task = self.backend.get_task(found['id'])
+                        timeline['cached'] = True
+                        timeline['task_id'] = task.id
+                        break
+            if task is None and self.use_cache:
+                task = self.backend.find_cached(self.command, self.version,
+                                                kwargs)
+                phases['cache_checked'] = time.time()
+                if task is not None:
+                    timeline['cached'] = True
+                    print("using cache")
 
         if task is None:
-            task, job = simcity.run_task({
+            task = self.backend.submit({
                 'command': self.command,
                 'version': self.version,
                 'input': kwargs,
                 'ensemble': self.ensemble,
-            }, self.host, self.max_jobs, polling_time=self.polling_time)
+            }, host, self.max_jobs)
+            phases['submitted'] = time.time()
+            timeline['task_id'] = task.id
+
+        if not timeline.get('cached'):
+            if self.journal is not None and 'pid' in timeline:
+                self.journal.task(timeline['pid'], task.id)
+            task = self.backend.wait(task, self.polling_time, cancelled)
+            phases['observed'] = time.time()
+            if task['lock'] > 0:
+                phases['locked'] = task['lock']
+            if task['done'] > 0:
+                phases['done'] = task['done']
 
+        if cancelled is not None and cancelled.is_set():
+            timeline['cancelled'] = True
+            raise TaskCancelled('Simulation %s was cancelled' % task.id)
         if task.has_error():
+            timeline['error'] = True
             raise EnvironmentError('Simulation %s failed: %s'
                                    % (task.id, str(task.get_errors())))
-        return self.scoring(task)
+        return task
+
+    def score(self, task, timeline):
+        """ Score a finished task. """
+        value = self.scoring(task)
+        timeline['phases']['scored'] = time.time()
+        return value
+
+    def _start_scorers(self):
+        self.score_q = mp.Queue()
+        for _ in range(self.scoring_processes):
+            scorer = mp.Process(target=run_scorer, args=(self,))
+            scorer.daemon = True
+            scorer.start()
+            self.scorers.append(scorer)
+
+    def close(self):
+        """ Stop the scoring processes, once they are idle. """
+        for _ in self.scorers:
+            self.score_q.put(None)
+        for scorer in self.scorers:
+            scorer.join()
+        self.scorers = []
+        self.score_q = None
 
     def start(self, p, host=None):
         self.current_pid += 1
-        self.proc[self.current_pid] = mp.Process(
-            target=run_simulator, args=(self, self.current_pid, p, host,))
-        self.proc[self.current_pid].start()
-        return self.current_pid
+        pid = self.current_pid
+        kwargs = self._input(p)
+        key = input_key(kwargs)
+        if self.journal is not None:
+            self.journal.submitted(pid, kwargs)
+
+        self.keys[pid] = key
+        if key in self.evaluated:
+            now = time.time()
+            self.metrics.record({'pid': pid, 'cached': True, 'phases': {
+                'started': now, 'joined': now}})
+            self._result(pid, self.evaluated[key])
+        else:
+            self._spawn(pid, p, host, self.resumed_tasks.pop(key, None))
+        return pid
+
+    def _spawn(self, pid, p, host, task_id=None):
+        if self.scoring_processes and self.score_q is None:
+            self._start_scorers()
+        self.started[pid] = time.time()
+        self.points[pid] = (p, host)
+        self.cancelled[pid] = mp.Event()
+        self.proc[pid] = mp.Process(
+            target=run_simulator,
+            args=(self, pid, p, host, self.cancelled[pid], task_id,))
+        self.proc[pid].start()
+
+    def _result(self, pid, value):
+        key = self.keys.pop(pid)
+        if self.memoize and not isinstance(value, Exception):
+            self.evaluated[key] = value
+        if self.journal is not None:
+            if isinstance(value, Exception):
+                self.journal.result(pid, error=str(value))
+            else:
+                self.journal.result(pid, value)
+        self.results.append((pid, value,))
+
+    def cancel(self, pid):
+        """
+        Cancel a started simulation, including its speculative copy. A
+        TaskCancelled exception will be joined as its result.
+        """
+        if pid not in self.cancelled:
+            return
+        twin = self.twins.pop(pid, None)
+        if twin is not None:
+            del self.twins[twin]
+            self._discard(twin)
+        self.cancelled[pid].set()
+
+    def _discard(self, pid):
+        self.discarded.add(pid)
+        self.cancelled[pid].set()
+
+    def _receive(self, pid, value, timeline):
+        phases = timeline['phases']
+        phases['started'] = self.started.pop(pid)
+        phases['joined'] = time.time()
+        self.proc.pop(pid).join()
+        del self.points[pid]
+        del self.cancelled[pid]
+        self.speculated.discard(pid)
+        primary = self.primary.pop(pid, pid)
+
+        if pid in self.discarded:
+            self.discarded.remove(pid)
+            timeline['cancelled'] = True
+            self.metrics.record(timeline)
+            return
+        self.metrics.record(timeline)
+
+        twin = self.twins.pop(pid, None)
+        if twin is not None:
+            del self.twins[twin]
+            if isinstance(value, Exception):
+                # the other copy may still succeed
+                return
+            self._discard(twin)
+
+        if not isinstance(value, Exception) and not timeline.get('cached'):
+            self.runtimes.add(phases['joined'] - phases['started'])
+        self._result(primary, value)
+
+    def _poll(self, block=False, timeout=None):
+        try:
+            message = self.proc_q.get(block, timeout)
+        except Empty:
+            return False
+        self._receive(*message)
+        return True
+
+    def _speculate(self):
+        if (not self.speculative or
+                len(self.runtimes) < self.speculative_min_samples):
+            return
+
+        limit = (self.runtimes.quantile(self.speculative_quantile) *
+                 self.speculative_factor)
+        now = time.time()
+        for pid in list(self.proc):
+            if (pid in self.primary or pid in self.speculated or
+                    pid in self.discarded or
+                    now - self.started[pid] <= limit):
+                continue
+
+            p, host = self.points[pid]
+            self.current_pid += 1
+            twin = self.current_pid
+            self.twins[pid] = twin
+            self.twins[twin] = pid
+            self.primary[twin] = pid
+            self.speculated.add(pid)
+            if self.journal is not None:
+                self.journal.submitted(twin, self._input(p))
+            self._spawn(twin, p, self._speculative_host(host))
+
+    def _speculative_host(self, host):
+        if host is None:
+            host = self.default_host
+        for other in self.speculative_hosts:
+            if other != host:
+                return other
+        return host
 
     def join(self):
-        pid, value = self.proc_q.get()
-        self.proc[pid].join()
-        del self.proc[pid]
-        return (pid, value,)
+        while len(self.results) == 0:
+            if self.speculative:
+                self._poll(True, self.polling_time)
+                self._speculate()
+            else:
+                self._poll(True)
+        return self.results.popleft()
 
     def has_result(self):
-        return not self.proc_q.empty()
+        while self._poll():
+            pass
+        self._speculate()
+        return len(self.results) > 0
 
     def is_running(self):
-        return len(self.proc) > 0 or self.has_result()
+        # speculative copies only count once their original has finished
+        for pid in self.proc:
+            if pid in self.discarded:
+                continue
+            primary = self.primary.get(pid, pid)
+            if primary == pid or primary not in self.proc:
+                return True
+        return self.has_result()
 
 
-def run_simulator(simulator, pid, p, host):
+def run_simulator(simulator, pid, p, host, cancelled=None, task_id=None):
+    timeline = {'pid': pid, 'phases': {'process_started': time.time()}}
     try:
-        # reinitialize database connections in each thread
-        simcity.init(simcity.get_config())
-        value = simulator(p, host)
-        simulator.proc_q.put((pid, value,))
+        simulator.backend.init_process()
+        timeline['phases']['initialized'] = time.time()
+        if simulator.score_q is None:
+            value = simulator(p, host, timeline, cancelled, task_id)
+            simulator.proc_q.put((pid, value, timeline,))
+        else:
+            # hand the task over to a scoring process
+            task = simulator.run(p, host, timeline, cancelled, task_id)
+            simulator.score_q.put((pid, task, timeline,))
+    except TaskCancelled as ex:
+        simulator.proc_q.put((pid, ex, timeline,))
     except Exception as ex:
         traceback.print_exc()
-        simulator.proc_q.put((pid, ex,))
+        timeline['error'] = True
+        simulator.proc_q.put((pid, ex, timeline,))
+
+
+def run_scorer(simulator):
+    simulator.backend.init_process()
+    while True:
+        message = simulator.score_q.get()
+        if message is None:
+            return
+        pid, task, timeline = message
+        timeline['phases']['scoring_started'] = time.time()
+        try:
+            value = simulator.score(task, timeline)
+        except Exception as ex:
+            traceback.print_exc()
+            timeline['error'] = True
+            value = ex
+        simulator.proc_q.put((pid, value, timeline,))
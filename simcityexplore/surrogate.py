@@ -0,0 +1,150 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import division
+import numpy as np
+
+
+class GaussianProcess(object):
+
+    """
+    Gaussian-process emulator with a squared exponential kernel.
+
+    The inverse of the correlation matrix is updated in O(n^2) with each
+    added point, so the emulator can be refit as simulation results come
+    in. Only the `max_points` most recent observations are kept, which
+    bounds the cost of updates and predictions and keeps the emulator
+    local to where a sampler currently is. The mean is the constant mean
+    of the observations and the process variance is their sample variance.
+
+    Arguments:
+        length_scale: correlation length, a number or one per dimension
+        nugget: noise variance relative to the process variance, which
+            keeps the correlation matrix well-conditioned
+        max_points: number of most recent observations to keep
+        refit_every: recompute the inverse from scratch after this many
+            incremental updates, to limit accumulated rounding errors
+    """
+
+    def __init__(self, length_scale=1.0, nugget=1e-6, max_points=200,
+                 refit_every=100):
+        self.length_scale = np.asarray(length_scale, dtype=float)
+        self.nugget = nugget
+        self.max_points = max_points
+        self.refit_every = refit_every
+        self._x = None
+        self._y = np.empty(0)
+        self._keys = set()
+        self._inv = np.empty((0, 0))
+        self._updates = 0
+        self._alpha = None
+
+    def __len__(self):
+        return len(self._y)
+
+    @property
+    def x(self):
+        return self._x
+
+    @property
+    def y(self):
+        return self._y
+
+    def correlation(self, a, b):
+        a = np.atleast_2d(a) / self.length_scale
+        b = np.atleast_2d(b) / self.length_scale
+        sqdist = (np.sum(a ** 2, axis=1)[:, np.newaxis] +
+                  np.sum(b ** 2, axis=1)[np.newaxis, :] -
+                  2 * np.dot(a, b.T))
+        return np.exp(-0.5 * np.maximum(sqdist, 0))
+
+    def add(self, x, y):
+        '''
+        Add an observation. Duplicate points and non-finite values are
+        ignored.
+        '''
+        x = np.asarray(x, dtype=float)
+        key = tuple(x)
+        if key in self._keys or not np.isfinite(y):
+            return
+        self._keys.add(key)
+        self._alpha = None
+
+        if len(self._y) >= self.max_points:
+            self._remove_oldest()
+
+        if len(self._y) == 0:
+            self._x = x[np.newaxis, :]
+            self._y = np.array([float(y)])
+            self._refit()
+            return
+
+        k = self.correlation(self._x, x)[:, 0]
+        b = np.dot(self._inv, k)
+        s = 1 + self.nugget - np.dot(k, b)
+        self._x = np.vstack((self._x, x))
+        self._y = np.append(self._y, float(y))
+        if s <= 0 or self._updates >= self.refit_every:
+            self._refit()
+            return
+
+        n = len(b)
+        inv = np.empty((n + 1, n + 1))
+        inv[:n, :n] = self._inv + np.outer(b, b) / s
+        inv[:n, n] = -b / s
+        inv[n, :n] = -b / s
+        inv[n, n] = 1 / s
+        self._inv = inv
+        self._updates += 1
+
+    def _remove_oldest(self):
+        self._keys.discard(tuple(self._x[0]))
+        inv = self._inv
+        self._inv = inv[1:, 1:] - np.outer(inv[1:, 0], inv[0, 1:]) / inv[0, 0]
+        self._x = self._x[1:]
+        self._y = self._y[1:]
+        self._updates += 1
+
+    def _refit(self):
+        R = self.correlation(self._x, self._x) + self.nugget * np.eye(
+            len(self._y))
+        self._inv = np.linalg.inv(R)
+        self._updates = 0
+
+    def predict(self, x, return_std=False):
+        '''
+        Predict the mean, and optionally the standard deviation, at points x.
+        Without observations, the mean is zero and the deviation infinite.
+        '''
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        if len(self._y) == 0:
+            mean = np.zeros(len(x))
+            if return_std:
+                return mean, np.full(len(x), np.inf)
+            return mean
+
+        mu = np.mean(self._y)
+        if self._alpha is None:
+            self._alpha = np.dot(self._inv, self._y - mu)
+        r = self.correlation(x, self._x)
+        mean = mu + np.dot(r, self._alpha)
+        if not return_std:
+            return mean
+
+        variance = np.var(self._y) if len(self._y) > 1 else 1.0
+        reduction = np.sum(np.dot(r, self._inv) * r, axis=1)
+        std = np.sqrt(variance * np.maximum(1 + self.nugget - reduction, 0))
+        return mean, std
@@ -0,0 +1,66 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function, division
+
+from simcityexplore.adaptive import AdaptiveSampler
+from simcityexplore.parameter import IntervalSpec
+from test_optimize import QuadraticSimulator
+from nose.tools import assert_equals, assert_true
+import numpy as np
+
+
+class StepSimulator(QuadraticSimulator):
+
+    """ Scores a smooth step at x = 7; flat elsewhere. """
+
+    def join(self):
+        pid = self.random.choice(list(self.running))
+        x, y = self.running.pop(pid)
+        if y > 19.5:
+            return pid, EnvironmentError('Simulation failed')
+        return pid, np.tanh((x - 7) * 5)
+
+
+def test_adaptive_sampler():
+    simulator = StepSimulator()
+    specs = [IntervalSpec('x', float, 0, 10), IntervalSpec('y', float, 0, 20)]
+    sampler = AdaptiveSampler(simulator, specs, split_points=8, seed=1)
+    results = list(sampler.run(400))
+
+    assert_equals(400, len(results))
+    assert_equals(400, simulator.current_pid)
+    assert_true(simulator.max_running <= simulator.max_jobs)
+    assert_equals(0, len(sampler.pending))
+    assert_true(np.all(sampler.priorities() > 0))
+
+    # the cells partition the unit cube and hold all successful scores
+    cells = sampler.cells()
+    volume = sum(np.prod(upper - lower) for lower, upper, _, _, _ in cells)
+    assert_true(np.isclose(1, volume))
+    succeeded = [v for _, v in results if not isinstance(v, Exception)]
+    assert_equals(len(succeeded), sum(c[2] for c in cells))
+    assert_equals(len(succeeded), sampler.count)
+    assert_true(np.isclose(np.mean(succeeded), sampler.mean))
+    for lower, upper, n, mean, variance in cells:
+        if n >= 2:
+            assert_true(variance >= 0)
+
+    # the step, 10% of the space, gets far more than 10% of the points
+    x = np.array([p[0] for p, _ in results])
+    assert_true(np.mean(np.abs(x - 7) < 0.5) > 0.2)
+    # but the flat region is still sampled
+    assert_true(np.mean(x < 6) > 0.1)
@@ -0,0 +1,108 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.backend import LocalBackend, FakeBackend
+from nose.tools import assert_equals, assert_true, assert_false
+import threading
+import json
+import tempfile
+import shutil
+import os
+
+SCRIPT = '''#!/bin/sh
+python -c "import json, sys; print(json.load(open(sys.argv[1]))['x'] * 2)" \\
+    "$1/input.json" > "$3/result.txt"
+'''
+
+
+def setup_command():
+    directory = tempfile.mkdtemp()
+    command = os.path.join(directory, 'double.sh')
+    with open(command, 'w') as f:
+        f.write(SCRIPT)
+    os.chmod(command, 0o755)
+    return directory, command
+
+
+def test_local_backend():
+    directory, command = setup_command()
+    try:
+        backend = LocalBackend(os.path.join(directory, 'tasks'), 2)
+        task = backend.run_task({'command': command, 'input': {'x': 2}},
+                                None, None, 0)
+        assert_false(task.has_error())
+        assert_true(task['done'] > 0)
+        assert_equals(['result.txt'], task.list_attachments())
+        assert_equals(b'4', task.get_attachment('result.txt')['data'].strip())
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_local_backend_failure():
+    directory = tempfile.mkdtemp()
+    try:
+        backend = LocalBackend(directory, 1)
+        task = backend.run_task({'command': 'false', 'input': {}},
+                                None, None, 0)
+        assert_true(task.has_error())
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_local_backend_cancel():
+    directory = tempfile.mkdtemp()
+    try:
+        backend = LocalBackend(directory, 1)
+        task = backend.submit({'command': 'sleep', 'input': {}}, None, None)
+        cancelled = threading.Event()
+        cancelled.set()
+        task = backend.wait(task, 0, cancelled)
+        assert_equals(['cancelled'], task.get_errors())
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_fake_backend():
+    backend = FakeBackend(latency=0.05, seed=1)
+    task = backend.run_task({'input': {'x': 2}}, None, None, 0)
+    assert_false(task.has_error())
+    assert_true(abs(task['done'] - task['lock'] - 0.05) < 1e-6)
+    assert_equals({'x': 2}, json.loads(
+        task.get_attachment('input.json')['data'].decode('utf-8')))
+
+    # tasks are only noticed to be done when polling
+    task = backend.run_task({'input': {}}, None, None, 0.2)
+    assert_true(task['done'] - task['lock'] < 0.1)
+
+    backend = FakeBackend(latency=1, distribution='exponential',
+                          failure_rate=0.5, seed=1)
+    task = backend.submit({'input': {}}, None, None)
+    cancelled = threading.Event()
+    cancelled.set()
+    task = backend.wait(task, 0.1, cancelled)
+    assert_equals(['cancelled'], task.get_errors())
+
+    backend.latency = 0
+    outcomes = [backend.run_task({'input': {'x': i}}, None, None, 0)
+                .has_error() for i in range(100)]
+    assert_true(30 < sum(outcomes) < 70)
+    # the outcome only depends on the seed and the input
+    backend = FakeBackend(failure_rate=0.5, seed=1)
+    assert_equals(outcomes, [backend.run_task({'input': {'x': i}}, None,
+                                              None, 0).has_error()
+                             for i in range(100)])
@@ -0,0 +1,72 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.chainstore import ChainStore
+from simcityexplore.ptsampler import PTSampler
+from test_ptsampler import GaussianSimulator, flat_prior
+from nose.tools import assert_equals, assert_true, assert_raises
+import numpy as np
+import tempfile
+import shutil
+import os
+
+
+def test_chain_store():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'chain')
+        chains = []
+        for store in (None, ChainStore(path, 2, 4, 2, sync=False)):
+            sampler = PTSampler(2, 4, 2, GaussianSimulator(), flat_prior,
+                                seed=1)
+            p0 = np.random.RandomState(2).rand(2, 4, 2)
+            for p, lnprob, lnlike in sampler.sample(p0, iterations=20,
+                                                    thin=5, store=store):
+                pass
+            chains.append(sampler if store is None else store)
+
+        memory, store = chains
+        assert_equals(4, len(store))
+        assert_equals((2, 4, 4, 2), store.chain.shape)
+        assert_true(np.array_equal(memory.chain, store.chain))
+        assert_true(np.array_equal(memory.lnprobability,
+                                   store.lnprobability))
+        assert_true(np.array_equal(memory.lnlikelihood, store.lnlikelihood))
+        assert_true(np.array_equal(memory.acceptance_fraction,
+                                   store.acceptance_fraction[:, :, -1]))
+        assert_true(np.array_equal(memory.flatchain[1, :, 0],
+                                   store.samples(1, 0)))
+
+        # a partially written step is discarded when reopening
+        with open(os.path.join(path, 'chain.bin'), 'ab') as f:
+            f.write(b'\0' * 10)
+        store = ChainStore(path)
+        assert_equals(4, len(store))
+        store.append(p, lnprob, lnlike, np.zeros((2, 4)))
+        assert_equals((2, 4, 5, 2), store.chain.shape)
+        assert_true(np.array_equal(p, store.chain[:, :, -1]))
+
+        assert_raises(ValueError, ChainStore, path, 3, 4, 2)
+        store.clear()
+        assert_equals((2, 4, 0, 2), ChainStore(path).chain.shape)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_chain_store_missing():
+    assert_raises(ValueError, ChainStore, '/nonexistent/chain')
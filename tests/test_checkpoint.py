@@ -0,0 +1,65 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.checkpoint import save_checkpoint, load_checkpoint
+from simcityexplore.ptsampler import PTSampler
+from simcityexplore.surrogate import GaussianProcess
+from test_ptsampler import GaussianSimulator, flat_prior
+from nose.tools import assert_equals, assert_true
+import numpy as np
+import tempfile
+import shutil
+import os
+
+
+def make_sampler(seed=None):
+    return PTSampler(2, 4, 2, GaussianSimulator(), flat_prior, seed=seed,
+                     surrogate=GaussianProcess(1.0, max_points=20),
+                     surrogate_min_points=5)
+
+
+def test_checkpoint_resume():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'checkpoint')
+        p0 = np.random.RandomState(2).rand(2, 4, 2)
+
+        sampler = make_sampler(seed=1)
+        for p, lnprob, lnlike in sampler.sample(p0, iterations=20):
+            pass
+        expected = sampler.chain
+
+        sampler = make_sampler(seed=1)
+        sampler.simulator.evaluated['key'] = 1.0
+        for i, (p, lnprob, lnlike) in enumerate(
+                sampler.sample(p0, iterations=10), 1):
+            save_checkpoint(path, sampler, p, lnprob, lnlike, iteration=i)
+        chain = sampler.chain
+
+        # a new process, without a seed
+        sampler = make_sampler()
+        p, lnprob, lnlike, info = load_checkpoint(path, sampler)
+        assert_equals({'iteration': 10}, info)
+        assert_equals({'key': 1.0}, sampler.simulator.evaluated)
+        for p, lnprob, lnlike in sampler.sample(p, lnprob, lnlike,
+                                                iterations=10):
+            pass
+        chain = np.concatenate((chain, sampler.chain), axis=2)
+        assert_true(np.array_equal(expected, chain))
+    finally:
+        shutil.rmtree(directory)
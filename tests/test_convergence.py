@@ -0,0 +1,73 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function, division
+
+from simcityexplore.convergence import ConvergenceMonitor
+from nose.tools import assert_true, assert_false
+import numpy as np
+
+
+def ar1(phi, nsteps, nwalkers, ndim, seed=1):
+    random = np.random.RandomState(seed)
+    x = np.empty((nsteps, nwalkers, ndim))
+    x[0] = random.randn(nwalkers, ndim)
+    for t in range(1, nsteps):
+        x[t] = phi * x[t - 1] + np.sqrt(1 - phi ** 2) * random.randn(
+            nwalkers, ndim)
+    return x
+
+
+def test_incremental_statistics():
+    x = ar1(0.5, 50, 4, 2)
+    monitor = ConvergenceMonitor(4, 2, max_lag=20)
+    for step in x:
+        monitor.add(step)
+
+    mu = np.mean(x, axis=0)
+    expected = np.array([np.sum((x[k:] - mu) * (x[:len(x) - k] - mu),
+                                axis=0) / (len(x) - k) for k in range(20)])
+    assert_true(np.allclose(expected, monitor.autocovariance()))
+
+    within = np.mean(np.var(x, axis=0, ddof=1), axis=0)
+    between = np.var(mu, axis=0, ddof=1)
+    rhat = np.sqrt((49 / 50 * within + between) / within)
+    assert_true(np.allclose(rhat, monitor.gelman_rubin()))
+
+
+def test_autocorrelation_time():
+    # the autocorrelation time of AR(1) is (1 + phi) / (1 - phi)
+    monitor = ConvergenceMonitor(8, 2, max_lag=100)
+    for step in ar1(0.8, 4000, 8, 2):
+        monitor.add(step)
+    tau = monitor.autocorrelation_time()
+    assert_true(np.all(np.abs(tau - 9) < 1.5))
+    assert_true(np.allclose(8 * 4000 / tau,
+                            monitor.effective_sample_size()))
+    assert_true(monitor.converged(max_rhat=1.05, min_ess=1000,
+                                  tau_factor=50))
+    assert_false(monitor.converged(min_ess=10000))
+
+
+def test_gelman_rubin_separated():
+    # walkers stuck in different modes have not converged
+    x = ar1(0.5, 200, 4, 1)
+    x[:, :2] += 5
+    monitor = ConvergenceMonitor(4, 1)
+    for step in x:
+        monitor.add(step)
+    assert_true(monitor.gelman_rubin()[0] > 2)
+    assert_false(monitor.converged(max_rhat=1.1))
@@ -0,0 +1,199 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.ensemble import (ensemble_view, ensemble_summary,
+                                     ensemble_summaries, iter_tasks,
+                                     finish_time)
+from nose.tools import assert_equals, assert_true
+from collections import namedtuple
+
+Row = namedtuple('Row', ['key', 'value'])
+
+
+def stats(count, total=0, sumsqr=0, low=0, high=0):
+    return {'count': count, 'sum': total, 'sumsqr': sumsqr, 'min': low,
+            'max': high}
+
+
+class Database(object):
+
+    """ Task database that stores documents in memory. """
+
+    def __init__(self):
+        self.docs = {}
+        self.requests = 0
+        self.saves = 0
+        self.db = self
+
+    def get(self, doc_id):
+        self.requests += 1
+        doc = self.docs.get(doc_id)
+        return None if doc is None else dict(doc)
+
+    def save(self, doc):
+        self.saves += 1
+        self.docs[doc['_id']] = dict(doc)
+
+
+class SummaryDatabase(Database):
+
+    """ Task database with the grouped rows of the summary view. """
+
+    def __init__(self, rows):
+        super(SummaryDatabase, self).__init__()
+        self.rows = rows
+        self.queries = []
+
+    def view(self, name, **params):
+        self.queries.append((name, params))
+        start, end = params['startkey'], params['endkey'][:-1]
+        return [row for row in self.rows
+                if row.key[:len(start)] == start and
+                row.key[:len(end)] == end]
+
+
+def test_ensemble_summary():
+    db = SummaryDatabase([
+        Row(['sim', '0.1', 'a', 'done'], stats(2, 30, 500, 10, 20)),
+        Row(['sim', '0.1', 'a', 'todo'], stats(5)),
+        Row(['sim', '0.1', 'b', 'done'], stats(1, 40, 1600, 40, 40)),
+        Row(['sim', '0.1', 'b', 'error'], stats(1)),
+        Row(['sim', '0.2', 'a', 'locked'], stats(3)),
+    ])
+    summary = ensemble_summary(db, 'sim', '0.1', 'a')
+    assert_equals(2, summary['done'])
+    assert_equals(5, summary['todo'])
+    assert_equals(0, summary['locked'])
+    assert_equals(7, summary['total'])
+    assert_equals({'mean': 15.0, 'std': 5.0, 'min': 10, 'max': 20},
+                  summary['runtime'])
+    # the view is grouped by the full key and added once
+    assert_equals(4, db.queries[0][1]['group_level'])
+    assert_equals('_stats', db.docs['_design/simcityexplore_summary'][
+        'views']['ensemble_status']['reduce'])
+
+    summary = ensemble_summary(db, 'sim', '0.1')
+    assert_equals(9, summary['total'])
+    assert_equals(1, summary['error'])
+    assert_equals(40, summary['runtime']['max'])
+    assert_equals(70 / 3.0, summary['runtime']['mean'])
+
+    summaries = ensemble_summaries(db, 'sim', '0.1')
+    assert_equals(['a', 'b'], sorted(summaries))
+    assert_equals(2, summaries['b']['total'])
+    assert_equals(None, ensemble_summary(db, 'sim', '0.2')['runtime'])
+
+
+class TaskDatabase(Database):
+
+    """ Task database with the sorted rows of each view. """
+
+    def __init__(self, views):
+        super(TaskDatabase, self).__init__()
+        self.views = dict((view, sorted(rows, key=lambda row: row.key))
+                          for view, rows in views.items())
+
+    def view(self, name, startkey=None, endkey=None, limit=None):
+        self.requests += 1
+        rows = self.views[name.split('/')[1]]
+        if startkey is not None:
+            rows = [row for row in rows if row.key >= startkey]
+        if isinstance(endkey, list) and len(endkey) > 1:
+            rows = [row for row in rows if row.key[:-1] == endkey[:-1]]
+        return iter(rows[:limit])
+
+
+def task_views(tasks):
+    ''' Rows of the views of the ensemble view of given task values. '''
+    views = {'all_docs': [], 'by_state': [], 'finished': []}
+    for task in tasks:
+        views['all_docs'].append(Row(task['id'], task))
+        if task.get('error'):
+            state = 'error'
+        elif task.get('done', 0) > 0:
+            state = 'done'
+        else:
+            state = 'todo'
+        views['by_state'].append(Row([state, task['id']], task))
+        if state != 'todo':
+            views['finished'].append(Row([finish_time(task), task['id']],
+                                         task))
+    return views
+
+
+def test_iter_tasks():
+    db = TaskDatabase(task_views(
+        {'id': 'task_%02d' % i, 'done': i if i % 3 == 0 else 0}
+        for i in range(25)))
+    tasks = list(iter_tasks(db, 'sim', '0.1', 'http://db', page_size=10))
+    assert_equals(['task_%02d' % i for i in range(25)],
+                  [task['id'] for task in tasks])
+    # one request for the design document and three pages
+    assert_equals(4, db.requests)
+    assert_true('_design/sim_0.1' in db.docs)
+
+    done = list(iter_tasks(db, 'sim', '0.1', 'http://db', state='done',
+                           page_size=3, prefetch=True))
+    assert_equals(['task_%02d' % i for i in range(3, 25, 3)],
+                  [task['id'] for task in done])
+
+    finished = list(iter_tasks(db, 'sim', '0.1', 'http://db',
+                               finished_since=10))
+    assert_equals(['task_12', 'task_15', 'task_18', 'task_21', 'task_24'],
+                  [task['id'] for task in finished])
+
+    # stopping early does not read further
+    db.requests = 0
+    tasks = iter_tasks(db, 'sim', '0.1', 'http://db', page_size=5)
+    assert_equals('task_00', next(tasks)['id'])
+    tasks.close()
+    assert_equals(1, db.requests)
+
+
+def test_ensemble_view_sync():
+    db = Database()
+    design_doc = ensemble_view(db, 'sim', '0.1', 'http://db', 'a')
+    assert_equals('sim_0.1_a', design_doc)
+    doc = db.docs['_design/sim_0.1_a']
+    assert_equals(['all_docs', 'by_state', 'finished'],
+                  sorted(doc['views']))
+    assert_true('http://db/' in doc['views']['all_docs']['map'])
+    assert_equals((1, 1), (db.requests, db.saves))
+
+    # known design documents are not requested again
+    ensemble_view(db, 'sim', '0.1', 'http://db', 'a')
+    assert_equals((1, 1), (db.requests, db.saves))
+
+    # a changed view is replaced
+    ensemble_view(db, 'sim', '0.1', 'http://other', 'a')
+    assert_equals((2, 2), (db.requests, db.saves))
+    doc = db.docs['_design/sim_0.1_a']
+    assert_true('http://other/' in doc['views']['all_docs']['map'])
+
+    design_doc = ensemble_view(db, '~/bin/sim "x"', '0.1', 'http://db',
+                               by='command')
+    assert_true(design_doc.startswith('command_'))
+    assert_true('/' not in design_doc)
+    assert_true('doc.command === "~/bin/sim \\"x\\""' in
+                db.docs['_design/' + design_doc]['views']['all_docs']['map'])
+
+    # another process with the same views does not replace them
+    other = Database()
+    other.docs = db.docs
+    ensemble_view(other, 'sim', '0.1', 'http://other', 'a')
+    assert_equals((1, 0), (other.requests, other.saves))
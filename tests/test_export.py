@@ -0,0 +1,87 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.export import export_ensemble, load_export
+from simcityexplore.parameter import IntervalSpec, ChoiceSpec
+from test_ensemble import TaskDatabase, task_views
+from nose.tools import assert_equals, assert_true
+from collections import namedtuple
+import numpy as np
+import tempfile
+import shutil
+
+Ensemble = namedtuple('Ensemble', ['name', 'specs'])
+
+
+def task(i, finished):
+    value = {'id': 'task_%02d' % i, 'lock': finished - 10,
+             'done': finished, 'input': {'x': i / 10.0, 'mode': 'a'}}
+    if i % 4 == 3:
+        value['error'] = [{'time': finished, 'message': 'failed'}]
+    return value
+
+
+def document(value):
+    ''' Task document of a view value. '''
+    doc = dict(value, _id=value['id'], type='task')
+    del doc['id']
+    return doc
+
+
+def test_export_ensemble():
+    directory = tempfile.mkdtemp()
+    try:
+        ensemble = Ensemble('e', [IntervalSpec('x', float, 0, 10),
+                                  ChoiceSpec('mode', ['a', 'b'], str)])
+        tasks = [task(i, 1000 + 100 * i) for i in range(10)]
+
+        # scored from the task document, as in a Simulator
+        def scoring(task):
+            return 2 * task['input']['x'] if task['type'] == 'task' else 0
+
+        db = TaskDatabase(task_views(tasks[:6]))
+        db.docs = dict((t['id'], document(t)) for t in tasks)
+        assert_equals(6, export_ensemble(db, 'sim', '0.1', ensemble,
+                                         'http://db', directory, scoring,
+                                         part_size=4))
+        data = load_export(directory)
+        assert_equals(['task_%02d' % i for i in range(6)], list(data['id']))
+        assert_true(np.allclose(np.arange(6) / 10.0, data['input_x']))
+        assert_equals(['a'] * 6, list(data['input_mode']))
+        assert_equals('error', data['state'][3])
+        assert_true(np.isnan(data['score'][3]))
+        assert_true(np.isnan(data['runtime'][3]))
+        assert_equals(0.4, data['score'][2])
+        assert_equals(10, data['runtime'][0])
+
+        # a task that finished within the overlap, but was reported late
+        tasks[6]['done'] = tasks[5]['done'] - 50
+        db = TaskDatabase(task_views(tasks))
+        db.docs = dict((t['id'], document(t)) for t in tasks)
+        assert_equals(4, export_ensemble(db, 'sim', '0.1', ensemble,
+                                         'http://db', directory, scoring,
+                                         overlap=100))
+        data = load_export(directory, ['id', 'score'])
+        assert_equals(['id', 'score'], sorted(data))
+        assert_equals(['task_%02d' % i for i in range(10)],
+                      sorted(data['id']))
+
+        assert_equals(0, export_ensemble(db, 'sim', '0.1', ensemble,
+                                         'http://db', directory, scoring))
+    finally:
+        shutil.rmtree(directory)
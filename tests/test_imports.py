@@ -0,0 +1,37 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from nose.tools import assert_equals
+import subprocess
+import json
+import sys
+import os
+
+PROGRAM = '''
+import json, sys
+import simcityexplore, simcityexplore.parameter, simcityexplore.ensemble
+import simcityexplore.simulator, simcityexplore.orthogonal
+import simcityexplore.simemcee, simcityexplore.runner
+print(json.dumps([m for m in ('picas', 'simcity', 'couchdb', 'numpy',
+                              'matplotlib', 'pyDOE') if m in sys.modules]))
+'''
+
+
+def test_light_imports():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', PROGRAM],
+                                     cwd=root)
+    assert_equals([], json.loads(output.decode('utf-8')))
@@ -0,0 +1,113 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.index import PointIndex, TaskIndex
+from simcityexplore.simulator import Simulator
+from simcityexplore.backend import LocalBackend
+from test_ensemble import TaskDatabase, task_views
+from test_simulator import setup_command, scoring
+from nose.tools import assert_equals, assert_true
+import numpy as np
+import tempfile
+import shutil
+import os
+
+
+def test_point_index():
+    random = np.random.RandomState(1)
+    points = random.rand(500, 2) * [10, 1]
+    index = PointIndex([0.5, 0.05])
+    for i, x in enumerate(points):
+        index.add(x, i)
+    assert_equals(500, len(index))
+
+    for x in random.rand(20, 2) * [12, 1.2] - [1, 0.1]:
+        distances = np.sqrt(np.sum(((points - x) / [0.5, 0.05]) ** 2,
+                                   axis=1))
+        distance, point, i = index.nearest(x)
+        assert_equals(np.argmin(distances), i)
+        assert_true(np.isclose(np.min(distances), distance))
+
+        found = index.within(x, 2)
+        assert_equals(sorted(np.flatnonzero(distances <= 2)),
+                      sorted(i for _, _, i in found))
+        assert_equals(sorted(d for d, _, _ in found), [d for d, _, _ in found])
+
+    assert_equals(None, index.nearest([100, 100], max_distance=5))
+    assert_equals(None, PointIndex([1]).nearest([0]))
+
+
+def test_task_index():
+    tasks = [{'id': 'task_%02d' % i, 'lock': 100 * i, 'done': 100 * i + 10,
+              'input': {'x': i, 'y': 0.5}} for i in range(1, 11)]
+    tasks[2]['error'] = [{'time': 320}]
+    tasks[3]['input'] = {'x': 4}
+    db = TaskDatabase(task_views(tasks[:5]))
+    index = TaskIndex(db, '~/sim.py', '0.1', 'http://db', ['x', 'y'],
+                      [1, 0.1], overlap=150)
+    assert_equals(3, index.refresh())
+    # tasks are matched by the command that a Simulator submits
+    design_doc, = db.docs.values()
+    assert_true('doc.command === "~/sim.py"' in
+                design_doc['views']['finished']['map'])
+    assert_equals('task_02', index.nearest([2.2, 0.5])[2]['id'])
+
+    db = TaskDatabase(task_views(tasks))
+    index.task_db = db
+    assert_equals(5, index.refresh())
+    assert_equals(8, len(index))
+    assert_equals(0, index.refresh())
+    assert_equals(['task_07', 'task_08', 'task_09'],
+                  sorted(task['id'] for _, _, task
+                         in index.within([8, 0.5], 1)))
+
+
+def test_simulator_reuse():
+    directory = tempfile.mkdtemp()
+    try:
+        command, tasks = setup_command(directory)
+        backend = LocalBackend(tasks, 2)
+        simulator = Simulator(
+            'test', '0.1', command, scoring, None, polling_time=0.1,
+            argnames=['x', 'first', 'second', 'fail'], backend=backend)
+        pid = simulator.start([1, 0, 0, 0])
+        assert_equals((pid, 'first'), simulator.join())
+        task_id = os.listdir(tasks)[0]
+
+        simulator.index = PointIndex([1, 1, 1, 1])
+        # tasks of another command or version are not reused
+        simulator.index.add([1.1, 0, 0, 0], {'id': 'other_command',
+                                             'command': 'other',
+                                             'version': '0.1'})
+        simulator.index.add([1.1, 0, 0, 0], {'id': 'other_version',
+                                             'command': command,
+                                             'version': '0.2'})
+        simulator.index.add([1, 0, 0, 0], {'id': task_id, 'command': command,
+                                           'version': '0.1'})
+        simulator.reuse_distance = 0.5
+        pid = simulator.start([1.2, 0, 0, 0])
+        # scored from the finished task, which did not run again
+        assert_equals((pid, 'first'), simulator.join())
+        assert_equals(1, len(os.listdir(tasks)))
+        assert_equals(1, simulator.metrics.tasks.value(outcome='cached'))
+
+        pid = simulator.start([2, 0, 0, 0])
+        assert_equals((pid, 'first'), simulator.join())
+        assert_equals(2, len(os.listdir(tasks)))
+    finally:
+        shutil.rmtree(directory)
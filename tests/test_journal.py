@@ -0,0 +1,97 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.journal import Journal, input_key, repair_last_line
+from nose.tools import assert_equals
+import tempfile
+import shutil
+import os
+
+
+def test_journal_replay():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'journal')
+        journal = Journal(path, sync=False)
+        journal.submitted(1, {'x': 0.1})
+        journal.task(1, 'task_1')
+        journal.result(1, 2.5)
+        journal.submitted(2, {'x': 0.2})
+        journal.task(2, 'task_2')
+        journal.submitted(3, {'x': 0.3})
+        journal.task(3, 'task_3')
+        journal.result(3, error='failed')
+        journal.submitted(4, {'x': 0.4})
+
+        # a new session reuses process ids
+        journal = Journal(path, sync=False)
+        journal.submitted(1, {'x': 0.5})
+        journal.task(1, 'task_5')
+        with open(path, 'a') as f:
+            f.write('{"event": "res')
+
+        results, tasks = journal.replay()
+        assert_equals({input_key({'x': 0.1}): 2.5}, results)
+        assert_equals({input_key({'x': 0.2}): 'task_2',
+                       input_key({'x': 0.5}): 'task_5'}, tasks)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_journal_truncated():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'journal')
+        journal = Journal(path, sync=False)
+        journal.submitted(1, {'x': 0.1})
+        journal.task(1, 't1')
+        with open(path, 'a') as f:
+            f.write('{"event": "res')
+
+        # the next session does not append to the truncated record
+        journal = Journal(path, sync=False)
+        journal.submitted(1, {'x': 0.2})
+        journal.task(1, 't2')
+        journal.result(1, 1.5)
+
+        results, tasks = journal.replay()
+        assert_equals({input_key({'x': 0.2}): 1.5}, results)
+        assert_equals({input_key({'x': 0.1}): 't1'}, tasks)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_repair_last_line():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'lines')
+        for content, repaired in (('', ''), ('{"a": 1}\n', '{"a": 1}\n'),
+                                  ('{"a": 1}\n{"b', '{"a": 1}\n'),
+                                  ('{"b', '')):
+            with open(path, 'w') as f:
+                f.write(content)
+            repair_last_line(path)
+            with open(path) as f:
+                assert_equals(repaired, f.read())
+        repair_last_line(os.path.join(directory, 'missing'))
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_journal_missing():
+    assert_equals(({}, {}), Journal('/nonexistent/journal').replay())
@@ -0,0 +1,74 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.logprob import SpecPrior, log_probability
+from simcityexplore.parameter import IntervalSpec, ChoiceSpec, StringSpec
+from simcityexplore.ptsampler import PTSampler
+from test_ptsampler import GaussianSimulator
+from nose.tools import assert_equals, assert_true, assert_raises
+import numpy as np
+
+
+class FailingSimulator(GaussianSimulator):
+
+    """ Fails to simulate points with a positive first value. """
+
+    def start(self, p):
+        pid = super(FailingSimulator, self).start(p)
+        if p[0] > 0:
+            self.results[-1] = (pid, EnvironmentError())
+        return pid
+
+
+def test_spec_prior():
+    prior = SpecPrior([IntervalSpec('x', float, -1, 1),
+                       ChoiceSpec('y', [1, 2, 4], int)])
+    assert_equals(0.0, prior([0.5, 2]))
+    assert_equals(float('-inf'), prior([1.5, 2]))
+    points = np.array([[-1, 1], [1, 4], [0, 3], [-2, 1]])
+    assert_true(np.array_equal([0, 0, -np.inf, -np.inf], prior(points)))
+    assert_equals((2, 4), prior(np.array([points, points])).shape)
+    assert_raises(ValueError, SpecPrior, [StringSpec('s')])
+
+
+def test_log_probability():
+    simulator = FailingSimulator()
+    prior = SpecPrior([IntervalSpec('x', float, -1, 1),
+                       IntervalSpec('y', float, -1, 1)])
+    points = [[-0.5, 0], [2, 0], [-0.5, 0], [0.5, 0.5], [-1, -1]]
+    lnprob, lnprior, lnlike = log_probability(simulator, prior, points)
+    # outside the support and duplicate points are not simulated
+    assert_equals(3, simulator.started)
+    assert_true(np.array_equal([0, -np.inf, 0, 0, 0], lnprior))
+    assert_true(np.allclose([-0.125, -np.inf, -0.125, -np.inf, -1], lnlike))
+    assert_true(np.allclose(lnprior + lnlike, lnprob))
+
+
+def test_ptsampler_spec_prior():
+    simulator = GaussianSimulator()
+    prior = SpecPrior([IntervalSpec('x', float, 0, 1),
+                       IntervalSpec('y', float, 0, 1)])
+    sampler = PTSampler(2, 8, 2, simulator, prior, seed=1)
+    p0 = np.random.RandomState(2).rand(2, 8, 2)
+    for p, lnprob, lnlike in sampler.sample(p0, iterations=50):
+        pass
+    assert_true(np.all((p >= 0) & (p <= 1)))
+    assert_true(np.all(np.isfinite(lnprob)))
+    # proposals outside the support are never simulated
+    assert_equals(sampler.nsimulated, simulator.started)
+    assert_true(simulator.started < 16 * 51)
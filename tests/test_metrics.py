@@ -0,0 +1,49 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.metrics import Metrics, Histogram, durations
+from nose.tools import assert_equals, assert_true, assert_almost_equals
+
+
+def test_durations():
+    phases = {'started': 10.0, 'process_started': 10.5, 'submitted': 11.0,
+              'locked': 20.0, 'done': 50.0, 'observed': 52.0}
+    assert_equals([('process_startup', 0.5), ('submission', 0.5),
+                   ('queue_wait', 9.0), ('run', 30.0), ('polling_lag', 2.0)],
+                  durations(phases))
+
+
+def test_histogram_quantile():
+    hist = Histogram('h', buckets=(1, 2, 3, 4))
+    for value in (0.5, 1.5, 2.5, 3.5):
+        hist.observe(value)
+    assert_equals(4, hist.count())
+    assert_almost_equals(2.0, hist.mean())
+    assert_almost_equals(2.0, hist.quantile(0.5))
+
+
+def test_metrics_export():
+    metrics = Metrics()
+    metrics.record({'pid': 1, 'phases': {'started': 0.0, 'joined': 3.0}})
+    metrics.record({'pid': 2, 'error': True, 'phases': {}})
+    assert_equals(1, metrics.tasks.value(outcome='simulated'))
+    assert_equals(1, metrics.tasks.value(outcome='error'))
+    assert_equals(1, metrics.phases.count(phase='result_transfer'))
+    text = metrics.prometheus_text()
+    assert_true('simcityexplore_tasks_total{outcome="error"} 1' in text)
+    assert_true('simcityexplore_task_seconds_count 1' in text)
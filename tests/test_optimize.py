@@ -0,0 +1,65 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.optimize import BatchOptimizer
+from simcityexplore.parameter import IntervalSpec
+from nose.tools import assert_equals, assert_true
+import numpy as np
+
+
+class QuadraticSimulator(object):
+
+    """
+    Scores the distance to (0.3, 0.7); simulations finish in random order.
+    """
+
+    max_jobs = 4
+
+    def __init__(self):
+        self.running = {}
+        self.current_pid = 0
+        self.max_running = 0
+        self.random = np.random.RandomState(3)
+
+    def start(self, p):
+        self.current_pid += 1
+        self.running[self.current_pid] = p
+        self.max_running = max(self.max_running, len(self.running))
+        return self.current_pid
+
+    def join(self):
+        pid = self.random.choice(list(self.running))
+        x, y = self.running.pop(pid)
+        if x > 0.95:
+            return pid, EnvironmentError('Simulation failed')
+        return pid, (x - 0.3) ** 2 + (y - 0.7) ** 2
+
+
+def test_batch_optimizer():
+    simulator = QuadraticSimulator()
+    specs = [IntervalSpec('x', float, 0, 1), IntervalSpec('y', float, 0, 1)]
+    optimizer = BatchOptimizer(simulator, specs, minimize=True, seed=1)
+    results = list(optimizer.run(40))
+
+    assert_equals(40, len(results))
+    assert_equals(40, simulator.current_pid)
+    assert_equals(4, simulator.max_running)
+    assert_true(optimizer.best_value < 0.005)
+    assert_true(np.allclose([0.3, 0.7], optimizer.best_point, atol=0.07))
+    assert_equals(optimizer.best_value,
+                  min(v for p, v in results if not isinstance(v, Exception)))
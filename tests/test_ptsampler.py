@@ -0,0 +1,114 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.ptsampler import PTSampler
+from simcityexplore.surrogate import GaussianProcess
+from nose.tools import assert_equals, assert_true
+from collections import deque
+import numpy as np
+
+
+class GaussianSimulator(object):
+
+    """ Evaluates a standard normal log-likelihood in-process. """
+
+    def __init__(self):
+        self.results = deque()
+        self.current_pid = 0
+        self.started = 0
+        self.evaluated = {}
+
+    def key(self, p):
+        return tuple(p)
+
+    def quantize(self, p):
+        return list(p)
+
+    def start(self, p):
+        self.current_pid += 1
+        self.started += 1
+        self.results.append((self.current_pid,
+                             -0.5 * float(np.sum(np.square(p)))))
+        return self.current_pid
+
+    def join(self):
+        return self.results.popleft()
+
+
+class ReversedSimulator(GaussianSimulator):
+
+    """ Finishes the most recently started simulation first. """
+
+    def join(self):
+        return self.results.pop()
+
+
+def flat_prior(x):
+    return 0.0 if np.all(np.abs(x) < 10) else float('-inf')
+
+
+def test_ptsampler_gaussian():
+    simulator = GaussianSimulator()
+    sampler = PTSampler(3, 8, 2, simulator, flat_prior, seed=1)
+    p0 = np.random.RandomState(2).rand(3, 8, 2)
+    for p, lnprob, lnlike in sampler.sample(p0, iterations=2000):
+        pass
+
+    assert_equals((3, 8, 2000, 2), sampler.chain.shape)
+    assert_equals((3, 16000, 2), sampler.flatchain.shape)
+    samples = sampler.flatchain[0, 8000:]
+    assert_true(np.all(np.abs(np.mean(samples, axis=0)) < 0.15))
+    assert_true(np.all(np.abs(np.std(samples, axis=0) - 1) < 0.15))
+    assert_true(np.all(sampler.acceptance_fraction > 0.2))
+    # lnprob stays consistent with the likelihood after swaps
+    assert_true(np.allclose(lnprob, sampler.betas[:, np.newaxis] * lnlike))
+
+
+def test_ptsampler_delayed_acceptance():
+    simulator = GaussianSimulator()
+    sampler = PTSampler(1, 8, 2, simulator, flat_prior, seed=1,
+                        surrogate=GaussianProcess(1.0, max_points=50))
+    p0 = np.random.RandomState(2).rand(1, 8, 2)
+    for p, lnprob, lnlike in sampler.sample(p0, iterations=100):
+        pass
+    sampler.reset()
+    sampler.train_surrogate = False
+    for p, lnprob, lnlike in sampler.sample(p, lnprob, lnlike,
+                                            iterations=1000):
+        pass
+
+    samples = sampler.flatchain[0]
+    assert_true(np.all(np.abs(np.mean(samples, axis=0)) < 0.2))
+    assert_true(np.all(np.abs(np.std(samples, axis=0) - 1) < 0.2))
+    # screened proposals are never simulated
+    assert_true(sampler.nscreened[0] > 0)
+    assert_true(sampler.nsimulated + sampler.nscreened[0] <=
+                np.sum(sampler.nprop))
+
+
+def test_ptsampler_completion_order():
+    # a seeded sampler proposes the same points, so a resumed run can reuse
+    # journaled results even if simulations finish in a different order
+    chains = []
+    for simulator in (GaussianSimulator(), ReversedSimulator()):
+        sampler = PTSampler(3, 8, 2, simulator, flat_prior, seed=1)
+        p0 = np.random.RandomState(2).rand(3, 8, 2)
+        for p, lnprob, lnlike in sampler.sample(p0, iterations=20):
+            pass
+        chains.append(sampler.chain)
+    assert_true(np.array_equal(chains[0], chains[1]))
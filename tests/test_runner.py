@@ -0,0 +1,150 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.runner import (sample_stream, ResultStore, Runner,
+                                   main)
+from simcityexplore.parameter import IntervalSpec, ChoiceSpec
+from test_ptsampler import GaussianSimulator
+from nose.tools import assert_equals, assert_true
+import numpy as np
+import tempfile
+import shutil
+import json
+import sys
+import os
+
+# Writes the sum of its inputs as result
+SCRIPT = '''#!{python}
+import json, os, sys
+args = json.load(open(os.path.join(sys.argv[1], 'input.json')))
+with open(os.path.join(sys.argv[3], 'result'), 'w') as f:
+    f.write(str(args['x'] + args['y']))
+'''
+
+
+def scoring(task):
+    return float(task.get_attachment('result')['data'])
+
+
+class CountingSimulator(GaussianSimulator):
+
+    """ Counts the simulations that are running at the same time. """
+
+    max_jobs = 3
+
+    def __init__(self):
+        super(CountingSimulator, self).__init__()
+        self.running = 0
+        self.max_running = 0
+
+    def key(self, p):
+        return json.dumps(p)
+
+    def start(self, p):
+        self.running += 1
+        self.max_running = max(self.running, self.max_running)
+        return super(CountingSimulator, self).start(p)
+
+    def join(self):
+        self.running -= 1
+        return super(CountingSimulator, self).join()
+
+
+def read(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_sample_stream():
+    specs = [IntervalSpec('x', float, 0, 10), ChoiceSpec('c', [1, 2], int)]
+    samples = list(sample_stream(specs, 250, seed=1, batch_size=100))
+    assert_equals(250, len(samples))
+    assert_equals(samples, list(sample_stream(specs, 250, seed=1,
+                                              batch_size=100)))
+    # each batch is stratified
+    x = np.array([s[0] for s in samples[:100]])
+    assert_equals(list(range(100)), sorted(np.floor(x * 10).astype(int)))
+    assert_equals(50, sum(1 for s in samples[100:200] if s[1] == 1))
+
+
+def test_runner():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'results.jsonl')
+        simulator = CountingSimulator()
+        store = ResultStore(path)
+        runner = Runner(simulator, store)
+        points = ([x, 0] for x in [1, 2, 1, 3, 4, 5, 2])
+        assert_equals(7, runner.run(points))
+        store.close()
+        # the first point was running when its duplicate came in
+        assert_equals(6, simulator.started)
+        assert_equals(3, simulator.max_running)
+        results = read(path)
+        assert_equals([1, 1, 2, 3, 4, 5, 2],
+                      [result['point'][0] for result in results])
+        assert_equals(-0.5, results[0]['value'])
+
+        # a crash while writing leaves a truncated last line
+        with open(path, 'a') as f:
+            f.write('{"point": [7')
+        skip = store.keys()
+        assert_equals(5, len(skip))
+        runner = Runner(simulator, store, max_in_flight=1, skip=skip)
+        assert_equals(1, runner.run([[1, 0], [6, 0]]))
+        store.close()
+        assert_equals(7, simulator.started)
+        assert_equals([6, 0], read(path)[-1]['point'])
+        assert_equals(6, len(store.keys()))
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_main():
+    directory = tempfile.mkdtemp()
+    argv = sys.argv
+    try:
+        command = os.path.join(directory, 'run.py')
+        with open(command, 'w') as f:
+            f.write(SCRIPT.format(python=sys.executable))
+        os.chmod(command, 0o755)
+        config = os.path.join(directory, 'config.json')
+        with open(config, 'w') as f:
+            json.dump({
+                'ensemble': 'test', 'version': '0.1', 'command': command,
+                'host': None, 'max_jobs': 2, 'polling_time': 0.1,
+                'parameters': [
+                    {'name': 'x', 'type': 'interval', 'min': 0, 'max': 1},
+                    {'name': 'y', 'type': 'choice', 'choices': [10, 20],
+                     'dtype': 'int'}],
+                'precisions': {'x': 0.01},
+                'scoring': 'test_runner:scoring',
+                'backend': 'local',
+                'task_directory': os.path.join(directory, 'tasks'),
+            }, f)
+        output = os.path.join(directory, 'results.jsonl')
+        sys.argv = ['simcityexplore-run', config, '--samples', '4',
+                    '--seed', '1', '--output', output]
+        main()
+        results = read(output)
+        assert_equals(4, len(results))
+        for result in results:
+            assert_true(np.isclose(sum(result['point']), result['value']))
+    finally:
+        sys.argv = argv
+        shutil.rmtree(directory)
@@ -0,0 +1,60 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.sampler import latin_hypercube, BatchSampler
+from simcityexplore.parameter import IntervalSpec
+from test_optimize import QuadraticSimulator
+from nose.tools import assert_equals, assert_true
+import numpy as np
+
+
+class GridSampler(BatchSampler):
+
+    """ Proposes the centre of the unit cube and keeps the results. """
+
+    def __init__(self, *args, **kwargs):
+        super(GridSampler, self).__init__(*args, **kwargs)
+        self.results = []
+
+    def propose(self, n):
+        return np.full((n, self.ndim), 0.5)
+
+    def _finished(self, u, value):
+        self.results.append((list(u), value))
+
+
+def test_latin_hypercube():
+    u = latin_hypercube(20, 3, np.random.RandomState(1))
+    assert_equals((20, 3), u.shape)
+    # one point in each of the 20 strata of each dimension
+    for d in range(3):
+        assert_equals(list(range(20)), sorted(np.floor(u[:, d] * 20)))
+    assert_true(np.array_equal(u, latin_hypercube(
+        20, 3, np.random.RandomState(1))))
+
+
+def test_batch_sampler():
+    simulator = QuadraticSimulator()
+    specs = [IntervalSpec('x', float, 0, 10), IntervalSpec('y', float, 0, 1)]
+    sampler = GridSampler(simulator, specs, initial_points=5, seed=1)
+    results = list(sampler.run(12))
+    assert_equals(12, len(results))
+    assert_equals(4, simulator.max_running)
+    assert_equals(12, len(sampler.results))
+    assert_equals(0, len(sampler.pending))
+    assert_equals(7, sum(p == [5.0, 0.5] for p, _ in results))
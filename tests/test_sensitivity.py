@@ -0,0 +1,90 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function, division
+
+from simcityexplore.sensitivity import (saltelli_design, sobol_indices,
+                                        sensitivity_analysis)
+from simcityexplore.parameter import IntervalSpec
+from test_runner import CountingSimulator
+from nose.tools import assert_equals, assert_true, assert_raises
+import numpy as np
+
+# Ishigami function with a = 7 and b = 0.1
+FIRST_ORDER = [0.3139, 0.4424, 0]
+TOTAL = [0.5576, 0.4424, 0.2437]
+
+
+def ishigami(x):
+    x = np.asarray(x)
+    return (np.sin(x[..., 0]) + 7 * np.sin(x[..., 1]) ** 2 +
+            0.1 * x[..., 2] ** 4 * np.sin(x[..., 0]))
+
+
+class IshigamiSimulator(CountingSimulator):
+
+    """ Evaluates the Ishigami function in-process. """
+
+    def start(self, p):
+        pid = super(IshigamiSimulator, self).start(p)
+        # failures are left out
+        value = EnvironmentError() if p[2] > 3.1 else float(ishigami(p))
+        self.results[-1] = (pid, value)
+        return pid
+
+
+def test_saltelli_design():
+    a, b, ab = saltelli_design(3, 10, seed=1)
+    assert_equals((3, 10, 3), ab.shape)
+    for i in range(3):
+        assert_true(np.all(ab[i, :, i] == b[:, i]))
+        others = [j for j in range(3) if j != i]
+        assert_true(np.all(ab[i][:, others] == a[:, others]))
+
+
+def test_sobol_indices():
+    a, b, ab = saltelli_design(3, 20000, seed=1)
+    scale = 2 * np.pi
+    f_ab = ishigami(ab * scale - np.pi)
+    f_ab[0, 5] = np.nan
+    indices = sobol_indices(ishigami(a * scale - np.pi),
+                            ishigami(b * scale - np.pi), f_ab,
+                            bootstrap=200, seed=2, max_values=10 ** 6)
+    assert_true(np.allclose(FIRST_ORDER, indices['first_order'], atol=0.05))
+    assert_true(np.allclose(TOTAL, indices['total'], atol=0.05))
+    for name in ('first_order', 'total'):
+        low, high = indices[name + '_interval']
+        assert_true(np.all(low < high))
+        assert_true(np.all(high - low < 0.1))
+
+
+def test_sobol_indices_invalid():
+    nan = np.full(5, np.nan)
+    assert_raises(ValueError, sobol_indices, nan, nan, np.ones((3, 5)))
+    ones = np.ones(5)
+    assert_raises(ValueError, sobol_indices, ones, ones, np.ones((3, 5)))
+
+
+def test_sensitivity_analysis():
+    simulator = IshigamiSimulator()
+    specs = [IntervalSpec(name, float, -np.pi, np.pi)
+             for name in ('x', 'y', 'z')]
+    indices = sensitivity_analysis(simulator, specs, 5000, bootstrap=100,
+                                   seed=1)
+    assert_equals(25000, simulator.started)
+    assert_true(simulator.max_running <= simulator.max_jobs)
+    assert_true(np.allclose(FIRST_ORDER, indices['first_order'], atol=0.1))
+    assert_true(np.allclose(TOTAL, indices['total'], atol=0.1))
@@ -0,0 +1,215 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.simulator import Simulator
+from simcityexplore.backend import LocalBackend, FakeBackend, TaskCancelled
+from simcityexplore.journal import Journal
+from nose.tools import assert_equals, assert_true, assert_false
+import tempfile
+import json
+import shutil
+import time
+import sys
+import os
+
+# Sleeps for `first` seconds on the first run of point x and `second` on
+# later runs; the first run exits with an error if `fail` is set.
+SCRIPT = '''#!{python}
+import json, os, sys, time
+args = json.load(open(os.path.join(sys.argv[1], 'input.json')))
+marker = os.path.join({directory!r}, 'started_%s' % args['x'])
+first = not os.path.exists(marker)
+open(marker, 'a').close()
+time.sleep(args['first'] if first else args['second'])
+if first and args['fail']:
+    sys.exit(1)
+with open(os.path.join(sys.argv[3], 'result'), 'w') as f:
+    f.write('first' if first else 'second')
+'''
+
+
+def scoring(task):
+    return task.get_attachment('result')['data'].decode()
+
+
+def setup_command(directory):
+    command = os.path.join(directory, 'run.py')
+    with open(command, 'w') as f:
+        f.write(SCRIPT.format(python=sys.executable, directory=directory))
+    os.chmod(command, 0o755)
+    tasks = os.path.join(directory, 'tasks')
+    os.mkdir(tasks)
+    return command, tasks
+
+
+def setup_simulator(directory):
+    command, tasks = setup_command(directory)
+    simulator = Simulator(
+        'test', '0.1', command, scoring, None, polling_time=0.1,
+        argnames=['x', 'first', 'second', 'fail'],
+        backend=LocalBackend(tasks, 8), speculative=True,
+        speculative_min_samples=2)
+    # establish a runtime distribution of fast tasks
+    simulator.start([1, 0.1, 0.1, 0])
+    simulator.start([2, 0.1, 0.1, 0])
+    simulator.join()
+    simulator.join()
+    return simulator, tasks
+
+
+def test_speculative_primary_wins():
+    directory = tempfile.mkdtemp()
+    try:
+        simulator, tasks = setup_simulator(directory)
+        pid = simulator.start([3, 1.5, 10, 0])
+        assert_equals((pid, 'first'), simulator.join())
+        assert_equals(4, len(os.listdir(tasks)))
+        assert_false(simulator.is_running())
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_speculative_twin_wins():
+    directory = tempfile.mkdtemp()
+    try:
+        simulator, tasks = setup_simulator(directory)
+        start = time.time()
+        pid = simulator.start([3, 10, 0.1, 0])
+        assert_equals((pid, 'second'), simulator.join())
+        assert_true(time.time() - start < 5)
+        assert_false(simulator.is_running())
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_speculative_primary_fails():
+    directory = tempfile.mkdtemp()
+    try:
+        simulator, tasks = setup_simulator(directory)
+        pid = simulator.start([3, 1, 1.5, 1])
+        assert_equals((pid, 'second'), simulator.join())
+        assert_false(simulator.is_running())
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_speculative_cancel():
+    directory = tempfile.mkdtemp()
+    try:
+        simulator, tasks = setup_simulator(directory)
+        pid = simulator.start([3, 10, 10, 0])
+        time.sleep(1)
+        simulator.has_result()
+        # the speculative copy submits its task from its own process
+        deadline = time.time() + 5
+        while len(os.listdir(tasks)) < 4 and time.time() < deadline:
+            time.sleep(0.1)
+        assert_equals(4, len(os.listdir(tasks)))
+
+        simulator.cancel(pid)
+        joined_pid, value = simulator.join()
+        assert_equals(pid, joined_pid)
+        assert_true(isinstance(value, TaskCancelled))
+        assert_false(simulator.is_running())
+        # the speculative copy is stopped as well
+        for proc in list(simulator.proc.values()):
+            proc.join(5)
+            assert_false(proc.is_alive())
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_resume():
+    directory = tempfile.mkdtemp()
+    try:
+        command, tasks = setup_command(directory)
+        backend = LocalBackend(tasks, 8)
+        argnames = ['x', 'first', 'second', 'fail']
+
+        # a crashed session: the first point finished, the second point
+        # was submitted but not run
+        journal = Journal(os.path.join(directory, 'journal'), sync=False)
+        journal.submitted(1, {'x': 1, 'first': 0, 'second': 0, 'fail': 0})
+        journal.task(1, 'task_1')
+        journal.result(1, 'journaled')
+        inputs = {'x': 2, 'first': 0, 'second': 0, 'fail': 0}
+        task = backend.submit({'command': command, 'version': '0.1',
+                               'input': inputs, 'ensemble': 'test'},
+                              None, 1)
+        journal.submitted(2, inputs)
+        journal.task(2, task.id)
+
+        simulator = Simulator('test', '0.1', command, scoring, None,
+                              polling_time=0.1, argnames=argnames,
+                              backend=backend, journal=journal)
+        simulator.resume()
+
+        pid = simulator.start([1, 0, 0, 0])
+        assert_equals((pid, 'journaled'), simulator.join())
+        pid = simulator.start([2, 0, 0, 0])
+        assert_equals((pid, 'first'), simulator.join())
+        # the reattached task ran in place of a new one
+        assert_equals([task.id], os.listdir(tasks))
+        assert_true(os.path.exists(os.path.join(task.output_dir, 'result')))
+        assert_false(simulator.is_running())
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_fake_backend():
+    def input_x(task):
+        return json.loads(task.get_attachment('input.json')['data']
+                          .decode('utf-8'))['x']
+
+    simulator = Simulator('test', '0.1', 'fake', input_x, None,
+                          polling_time=0.01, argnames=['x'],
+                          backend=FakeBackend(latency=0.01))
+    pids = dict((simulator.start([x]), x) for x in range(20))
+    for _ in range(20):
+        pid, value = simulator.join()
+        assert_equals(pids.pop(pid), value)
+    assert_equals(20, simulator.metrics.tasks.value(outcome='simulated'))
+
+
+def test_scoring_processes():
+    def scorer_pid(task):
+        x = json.loads(task.get_attachment('input.json')['data']
+                       .decode('utf-8'))['x']
+        if x == 0:
+            raise ValueError('cannot score')
+        return os.getpid()
+
+    simulator = Simulator('test', '0.1', 'fake', scorer_pid, None,
+                          polling_time=0.01, argnames=['x'],
+                          backend=FakeBackend(latency=0.01),
+                          scoring_processes=2)
+    try:
+        for x in range(10):
+            simulator.start([x])
+        values = [simulator.join()[1] for _ in range(10)]
+        errors = [value for value in values if isinstance(value, Exception)]
+        assert_equals(1, len(errors))
+        assert_true(isinstance(errors[0], ValueError))
+        # scored by the two scoring processes, not by the simulations
+        scorers = set(scorer.pid for scorer in simulator.scorers)
+        assert_equals(2, len(scorers))
+        assert_true(set(values) - set(errors) <= scorers)
+        assert_equals(0, len(simulator.proc))
+    finally:
+        simulator.close()
+    assert_equals([], simulator.scorers)
@@ -0,0 +1,52 @@
+# SIM-CITY explore
+#
+# Copyright 2015 Joris Borgdorff <j.borgdorff@esciencecenter.nl>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from simcityexplore.surrogate import GaussianProcess
+from nose.tools import assert_equals, assert_true
+import numpy as np
+
+
+def test_gaussian_process_incremental():
+    random = np.random.RandomState(1)
+    x = random.rand(60, 2)
+    y = np.sin(3 * x[:, 0]) + x[:, 1]
+
+    gp = GaussianProcess(0.3, max_points=40, refit_every=1000)
+    for xi, yi in zip(x, y):
+        gp.add(xi, yi)
+    gp.add(x[-1], y[-1])
+    gp.add([0.5, 0.5], float('-inf'))
+    assert_equals(40, len(gp))
+    assert_true(np.array_equal(x[20:], gp.x))
+
+    # a window of 40 points, each refit from scratch
+    full = GaussianProcess(0.3, max_points=40, refit_every=0)
+    for xi, yi in zip(x[20:], y[20:]):
+        full.add(xi, yi)
+
+    test = random.rand(20, 2)
+    mean, std = gp.predict(test, return_std=True)
+    full_mean, full_std = full.predict(test, return_std=True)
+    assert_true(np.allclose(mean, full_mean, rtol=1e-3, atol=1e-3))
+    assert_true(np.allclose(std, full_std, rtol=1e-2, atol=1e-3))
+
+    mean, std = gp.predict(x[20:], return_std=True)
+    assert_true(np.allclose(mean, y[20:], atol=1e-3))
+    # far from the observations, the prior deviation is predicted
+    _, std = gp.predict([[5.0, 5.0]], return_std=True)
+    assert_true(np.allclose(std[0], np.std(gp.y), rtol=1e-3))